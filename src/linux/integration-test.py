@@ -17,6 +17,8 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
+import atexit
+import enum
 import os
 import sys
 import dbus
@@ -27,7 +29,6 @@ import unittest
 import time
 import re
 from output_checker import OutputChecker
-from packaging.version import parse as parse_version
 
 edir = os.path.dirname(sys.argv[0])
 
@@ -37,6 +38,22 @@ except ImportError:
     sys.stderr.write('Skipping tests, python-dbusmock not available (http://pypi.python.org/pypi/python-dbusmock).\n')
     sys.exit(77)
 
+def parse_release(version):
+    '''Split a version string into its release numbers and whether that is all.
+
+    This does not need packaging. Parsing stops at the first part which is not
+    purely numeric; such a pre-release, dev or other suffixed version sorts
+    before the plain release, so e.g. 0.23.2.dev1 < 0.23.2.
+    '''
+    release = []
+    for part in version.split('.'):
+        if not part.isdigit():
+            return (tuple(release), False)
+        release.append(int(part))
+    return (tuple(release), True)
+
+DBUSMOCK_GE_0_23_2 = parse_release(dbusmock.__version__) >= ((0, 23, 2), True)
+
 UP = 'org.freedesktop.UPower'
 UP_DEVICE = 'org.freedesktop.UPower.Device'
 UP_DISPLAY_OBJECT_PATH = '/org/freedesktop/UPower/devices/DisplayDevice'
@@ -44,58 +61,152 @@ UP_DAEMON_ACTION_DELAY = 20
 UP_HISTORY_SAVE_INTERVAL = (10*60)
 UP_HISTORY_SAVE_INTERVAL_LOW_POWER = 5
 
+# sysfs attributes shared by the simulated laptop batteries
+BATTERY_ATTRIBUTES = ('type', 'Battery', 'present', '1', 'voltage_now', '12000000')
+# sysfs device names of a device behind a Logitech Unifying (HID++)
+# receiver, relative to /sys/devices
+HIDPP_USB = 'pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2'
+HIDPP_RECEIVER = f'{HIDPP_USB}/0003:046D:C52B.0009'
+HIDPP_DEVICE = f'{HIDPP_RECEIVER}/0003:046D:4101.000A'
+HIDPP_INPUT = f'{HIDPP_DEVICE}/input/input22'
+HIDPP_PSU = f'{HIDPP_DEVICE}/power_supply/hidpp_battery_3'
+# devices of a bluetooth HID mouse, for _add_devices(); the battery comes
+# last, after the input nodes which upowerd looks at to find the device type
+BT_HCI = 'pci0000:00/0000:00:14.0/usb2/2-7/2-7:1.0/bluetooth/hci0'
+BT_HID = f'{BT_HCI}/hci0:256/0005:046D:B00D.0002'
+BT_HID_MOUSE_DEVICES = (
+    ('bluetooth', BT_HCI, {}, {}),
+    ('bluetooth', f'{BT_HCI}/hci0:256', {}, {'DEVTYPE': 'link'}),
+    ('hid', BT_HID, {}, {'HID_NAME': 'Fancy BT Mouse'}),
+    ('input', f'{BT_HID}/input/input22', {}, {'ID_INPUT_MOUSE': '1'}),
+    ('input', f'{BT_HID}/input/input22/mouse1', {}, {'ID_INPUT_MOUSE': '1'}),
+    ('power_supply', f'{BT_HID}/power_supply/hid-00:1f:20:96:33:47-battery',
+     {'type': 'Battery',
+      'scope': 'Device',
+      'present': '1',
+      'online': '1',
+      'status': 'Discharging',
+      'capacity': '30',
+      'model_name': 'Fancy BT mouse'},
+     {}),
+)
+# udev properties of a fake APC UPS; the HID state gets added per test
+UPS_PROPERTIES = ('DEVNAME', 'null', 'UPOWER_VENDOR', 'APC',
+                  'UPOWER_BATTERY_TYPE', 'ups', 'UPOWER_FAKE_DEVICE', '1')
+
 DEVICE_IFACE = 'org.bluez.Device1'
 BATTERY_IFACE = 'org.bluez.Battery1'
 
-(UP_DEVICE_STATE_UNKNOWN,
- UP_DEVICE_STATE_CHARGING,
- UP_DEVICE_STATE_DISCHARGING,
- UP_DEVICE_STATE_EMPTY,
- UP_DEVICE_STATE_FULLY_CHARGED,
- UP_DEVICE_STATE_PENDING_CHARGE,
- UP_DEVICE_STATE_PENDING_DISCHARGE) = range(7)
-
-(UP_DEVICE_LEVEL_UNKNOWN,
- UP_DEVICE_LEVEL_NONE,
- UP_DEVICE_LEVEL_DISCHARGING,
- UP_DEVICE_LEVEL_LOW,
- UP_DEVICE_LEVEL_CRITICAL,
- UP_DEVICE_LEVEL_ACTION,
- UP_DEVICE_LEVEL_NORMAL,
- UP_DEVICE_LEVEL_HIGH,
- UP_DEVICE_LEVEL_FULL) = range(9)
-
-(UP_DEVICE_KIND_UNKNOWN,
- UP_DEVICE_KIND_LINE_POWER,
- UP_DEVICE_KIND_BATTERY,
- UP_DEVICE_KIND_UPS,
- UP_DEVICE_KIND_MONITOR,
- UP_DEVICE_KIND_MOUSE,
- UP_DEVICE_KIND_KEYBOARD,
- UP_DEVICE_KIND_PDA,
- UP_DEVICE_KIND_PHONE,
- UP_DEVICE_KIND_MEDIA_PLAYER,
- UP_DEVICE_KIND_TABLET,
- UP_DEVICE_KIND_COMPUTER,
- UP_DEVICE_KIND_GAMING_INPUT,
- UP_DEVICE_KIND_PEN,
- UP_DEVICE_KIND_TOUCHPAD,
- UP_DEVICE_KIND_MODEM,
- UP_DEVICE_KIND_NETWORK,
- UP_DEVICE_KIND_HEADSET,
- UP_DEVICE_KIND_SPEAKERS,
- UP_DEVICE_KIND_HEADPHONES,
- UP_DEVICE_KIND_VIDEO,
- UP_DEVICE_KIND_OTHER_AUDIO,
- UP_DEVICE_KIND_REMOTE_CONTROL,
- UP_DEVICE_KIND_PRINTER,
- UP_DEVICE_KIND_SCANNER,
- UP_DEVICE_KIND_CAMERA,
- UP_DEVICE_KIND_WEARABLE,
- UP_DEVICE_KIND_TOY,
- UP_DEVICE_KIND_BLUETOOTH_GENERIC) = range(29)
-
-class Tests(dbusmock.DBusTestCase):
+# bluez Appearance (GAP) and Class of Device values
+BT_APPEARANCE_MOUSE = 0x03c2
+BT_APPEARANCE_HEART_RATE_BELT = 0x0341
+BT_CLASS_HEADSET = 0x240404
+BT_CLASS_HEADPHONES = 0x240418
+BT_CLASS_PHONE = 0x5a020c
+BT_CLASS_COMPUTER = 0x6c010c
+
+class DeviceState(enum.IntEnum):
+    UNKNOWN = 0
+    CHARGING = enum.auto()
+    DISCHARGING = enum.auto()
+    EMPTY = enum.auto()
+    FULLY_CHARGED = enum.auto()
+    PENDING_CHARGE = enum.auto()
+    PENDING_DISCHARGE = enum.auto()
+
+class DeviceLevel(enum.IntEnum):
+    UNKNOWN = 0
+    NONE = enum.auto()
+    DISCHARGING = enum.auto()
+    LOW = enum.auto()
+    CRITICAL = enum.auto()
+    ACTION = enum.auto()
+    NORMAL = enum.auto()
+    HIGH = enum.auto()
+    FULL = enum.auto()
+
+class DeviceKind(enum.IntEnum):
+    UNKNOWN = 0
+    LINE_POWER = enum.auto()
+    BATTERY = enum.auto()
+    UPS = enum.auto()
+    MONITOR = enum.auto()
+    MOUSE = enum.auto()
+    KEYBOARD = enum.auto()
+    PDA = enum.auto()
+    PHONE = enum.auto()
+    MEDIA_PLAYER = enum.auto()
+    TABLET = enum.auto()
+    COMPUTER = enum.auto()
+    GAMING_INPUT = enum.auto()
+    PEN = enum.auto()
+    TOUCHPAD = enum.auto()
+    MODEM = enum.auto()
+    NETWORK = enum.auto()
+    HEADSET = enum.auto()
+    SPEAKERS = enum.auto()
+    HEADPHONES = enum.auto()
+    VIDEO = enum.auto()
+    OTHER_AUDIO = enum.auto()
+    REMOTE_CONTROL = enum.auto()
+    PRINTER = enum.auto()
+    SCANNER = enum.auto()
+    CAMERA = enum.auto()
+    WEARABLE = enum.auto()
+    TOY = enum.auto()
+    BLUETOOTH_GENERIC = enum.auto()
+
+# UP_DEVICE_STATE_UNKNOWN etc. as plain ints
+for _enum, _prefix in ((DeviceState, 'UP_DEVICE_STATE'),
+                       (DeviceLevel, 'UP_DEVICE_LEVEL'),
+                       (DeviceKind, 'UP_DEVICE_KIND')):
+    for _m in _enum:
+        globals()[f'{_prefix}_{_m.name}'] = int(_m)
+
+def get_service_exec(path):
+    '''Get the Exec= command line of a D-Bus .service file.
+
+    Return None if the file does not exist or has no Exec= line.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            data = b'\n' + f.read()
+    except FileNotFoundError:
+        return None
+
+    start = data.find(b'\nExec=')
+    if start < 0:
+        return None
+    start += len(b'\nExec=')
+    end = data.find(b'\n', start)
+    return data[start:end if end >= 0 else None].decode().strip()
+
+SYSTEM_DAEMON_PATH = get_service_exec('/usr/share/dbus-1/system-services/org.freedesktop.UPower.service')
+
+_test_bus = None
+
+def setup_test_bus():
+    '''Set up a fake system D-BUS.
+
+    This is done only once per process, and torn down again at exit.
+    '''
+    global _test_bus
+
+    if _test_bus is None:
+        _test_bus = Gio.TestDBus.new(Gio.TestDBusFlags.NONE)
+        _test_bus.up()
+        atexit.register(_test_bus.down)
+        try:
+            del os.environ['DBUS_SESSION_BUS_ADDRESS']
+        except KeyError:
+            pass
+        os.environ['DBUS_SYSTEM_BUS_ADDRESS'] = _test_bus.get_bus_address()
+
+    return _test_bus
+
+class UPowerTestCase(dbusmock.DBusTestCase):
+    '''Common setup and helpers for upowerd tests'''
+
     @classmethod
     def setUpClass(cls):
         # run from local build tree if we are in one, otherwise use system instance
@@ -111,12 +222,7 @@ class Tests(dbusmock.DBusTestCase):
             cls.local_daemon = False
         else:
             print('Testing installed system binaries')
-            cls.daemon_path = None
-            with open('/usr/share/dbus-1/system-services/org.freedesktop.UPower.service') as f:
-                for line in f:
-                    if line.startswith('Exec='):
-                        cls.daemon_path = line.split('=', 1)[1].strip()
-                        break
+            cls.daemon_path = SYSTEM_DAEMON_PATH
             assert cls.daemon_path, 'could not determine daemon path from D-BUS .service file'
             cls.local_daemon = False
 
@@ -125,33 +231,49 @@ class Tests(dbusmock.DBusTestCase):
                                   GLib.LogLevelFlags.LEVEL_ERROR |
                                   GLib.LogLevelFlags.LEVEL_CRITICAL)
 
-        # set up a fake system D-BUS
-        cls.test_bus = Gio.TestDBus.new(Gio.TestDBusFlags.NONE)
-        cls.test_bus.up()
-        try:
-            del os.environ['DBUS_SESSION_BUS_ADDRESS']
-        except KeyError:
-            pass
-        os.environ['DBUS_SYSTEM_BUS_ADDRESS'] = cls.test_bus.get_bus_address()
-
+        cls.test_bus = setup_test_bus()
         cls.dbus = Gio.bus_get_sync(Gio.BusType.SYSTEM, None)
-        cls.dbus_con = cls.get_dbus(True)
+        # assertEventually() re-checks its condition whenever a signal gets
+        # dispatched, so listen to all property changes for the whole class
+        cls.props_changed_sub = cls.dbus.signal_subscribe(
+            None, 'org.freedesktop.DBus.Properties', 'PropertiesChanged', None, None,
+            Gio.DBusSignalFlags.NONE, lambda *args: None)
+
+        # environment for the daemon, start_daemon() adds the per-daemon bits
+        cls.daemon_env = os.environ.copy()
+        # Hotfix for https://github.com/systemd/systemd/issues/23499
+        cls.daemon_env['SYSTEMD_DEVICE_VERIFY_SYSFS'] = '0'
+
+        # configuration files, see get_config_file(); the default one is for
+        # tests which do not pass their own
+        cls.tmpdir = tempfile.mkdtemp(prefix='upower-test-')
+        cls.config_files = {}
+        cls.default_config = cls.get_config_file()
+
+        # The testbed and the daemon are shared between the tests of a class,
+        # see start_daemon() and tearDown()
+        cls.testbed = UMockdev.Testbed.new()
+        cls.proxy = None
+        cls.daemon = None
+        cls.daemon_config = None
+
+        # logind mock, shared as well and reset after tests which stop the
+        # daemon, see tearDown(); only spawned along with the first daemon,
+        # see start_daemon()
+        cls.logind = None
+        cls.logind_obj = None
 
     @classmethod
     def tearDownClass(cls):
-        cls.test_bus.down()
-        dbusmock.DBusTestCase.tearDownClass()
-
-    def setUp(self):
-        '''Set up a local umockdev testbed.
-
-        The testbed is initially empty.
-        '''
-        self.testbed = UMockdev.Testbed.new()
-
-        self.proxy = None
-        self.daemon = None
-        self.start_logind({'CanHybridSleep' : 'yes'})
+        try:
+            cls.stop_daemon()
+        finally:
+            cls.dbus.signal_unsubscribe(cls.props_changed_sub)
+            if cls.logind:
+                cls.stop_process(cls.logind)
+            cls.testbed = None
+            shutil.rmtree(cls.tmpdir)
+            dbusmock.DBusTestCase.tearDownClass()
 
     @classmethod
     def stop_process(cls, proc, timeout=1):
@@ -164,8 +286,65 @@ class Tests(dbusmock.DBusTestCase):
             proc.wait()
 
     def tearDown(self):
-        del self.testbed
-        self.stop_daemon()
+        # keep the daemon running for the next test only if this one did not
+        # add anything to the testbed; otherwise it gets a new testbed, and
+        # the daemon keeps using the umockdev directory of the old one
+        cls = type(self)
+        try:
+            if self.testbed_is_empty():
+                if cls.daemon:
+                    self.check_daemon()
+            else:
+                try:
+                    self.stop_daemon()
+                finally:
+                    # drop the old testbed first, it unsets $UMOCKDEV_DIR when freed
+                    cls.testbed = None
+                    cls.testbed = UMockdev.Testbed.new()
+        finally:
+            # a running daemon holds a delay inhibitor of logind and watches
+            # its name, so only reset logind once there is no daemon anymore
+            if cls.logind and not cls.daemon:
+                self.reset_logind()
+
+    def check_daemon(self):
+        '''Check that a daemon which is kept for the next test is still fine.
+
+        Otherwise a crash or a critical/warning during this test would only
+        show up when some later test stops the daemon.
+        '''
+        cls = type(self)
+        try:
+            self.assertEqual(cls.daemon.poll(), None, 'daemon crashed')
+            # criticals abort the daemon, and so do warnings unless it was
+            # started with warns; it may not have exited yet, so also look for
+            # them in the log. upowerd prints its own messages in red, other
+            # log domains go through the GLib default handler.
+            if not cls.daemon_config[1]:
+                self.daemon_log.check_no_line_re(rb'\x1b\[31m|\b(WARNING|CRITICAL) \*\*',
+                                                 failmsg='daemon logged a warning or critical')
+        except AssertionError:
+            # do not hand a broken daemon to the next test
+            try:
+                cls.stop_daemon()
+            except AssertionError:
+                pass
+            raise
+
+    def testbed_update(self, dev, attributes, action='change'):
+        '''Set several sysfs attributes of a device and send one uevent.'''
+
+        for name, value in attributes.items():
+            self.testbed.set_attribute(dev, name, value)
+        self.testbed.uevent(dev, action)
+
+    def testbed_is_empty(self):
+        '''Check whether no device has been added to the testbed yet.'''
+
+        try:
+            return not os.listdir(os.path.join(self.testbed.get_sys_dir(), 'devices'))
+        except FileNotFoundError:
+            return True
 
     #
     # Daemon control and D-BUS I/O
@@ -174,113 +353,217 @@ class Tests(dbusmock.DBusTestCase):
     def start_daemon(self, cfgfile=None, warns=False):
         '''Start daemon and create DBus proxy.
 
-        Do this after adding the devices you want to test with. At the moment
-        this only works with coldplugging, as we do not currently have a way to
-        inject simulated uevents.
+        Devices which are in the testbed already are coldplugged on startup.
+        Devices added or changed afterwards reach the daemon as hotplug events
+        sent with self.testbed.uevent(), see testbed_update() and
+        UPowerReadOnlyTests.
+
+        A daemon that is still running from a previous test is re-used if it
+        was started with the same cfgfile and warns, and the testbed is still
+        empty. tearDown() stops the daemon after any test that added devices.
+        That test also gets a new testbed, and the daemon only knows the
+        umockdev directory of the testbed it was started with.
 
         When done, this sets self.proxy as the Gio.DBusProxy for upowerd.
         '''
-        env = os.environ.copy()
-        if not cfgfile:
-            _, cfgfile = tempfile.mkstemp(prefix='upower-cfg-')
-            self.addCleanup(os.unlink, cfgfile)
-        env['UPOWER_CONF_FILE_NAME'] = cfgfile
-        env['UPOWER_HISTORY_DIR'] = tempfile.mkdtemp(prefix='upower-history-')
-        self.addCleanup(shutil.rmtree, env['UPOWER_HISTORY_DIR'])
+        cls = type(self)
+        config = (cfgfile, warns)
+        if (cls.daemon and cls.daemon.poll() is None and
+                cls.daemon_config == config and self.testbed_is_empty()):
+            cls.daemon_log.clear()
+            return
+
+        self.stop_daemon()
+
+        if os.getenv('VALGRIND') != None:
+            valgrind = shutil.which('valgrind')
+            if valgrind is None:
+                self.fail('$VALGRIND is set, but valgrind not found in $PATH')
+            daemon_path = [valgrind, self.daemon_path, '-v']
+        else:
+            daemon_path = [self.daemon_path, '-v']
+
+        # upowerd takes a logind inhibitor lock on startup, and fails with
+        # fatal-warnings if there is nobody to hand it out
+        if not cls.logind:
+            cls.start_logind({'CanHybridSleep' : 'yes'})
+
+        env = cls.daemon_env.copy()
+        cls.daemon_tmpdir = tempfile.mkdtemp(prefix='upower-')
+        env['UPOWER_CONF_FILE_NAME'] = cfgfile or cls.default_config
+        env['UPOWER_HISTORY_DIR'] = os.path.join(cls.daemon_tmpdir, 'history')
+        os.mkdir(env['UPOWER_HISTORY_DIR'])
         env['G_DEBUG'] = 'fatal-criticals' if warns else 'fatal-warnings'
         # note: Python doesn't propagate the setenv from Testbed.new(), so we
         # have to do that ourselves
         env['UMOCKDEV_DIR'] = self.testbed.get_root_dir()
-        # Hotfix for https://github.com/systemd/systemd/issues/23499
-        env['SYSTEMD_DEVICE_VERIFY_SYSFS'] = '0'
-        self.daemon_log = OutputChecker()
+        cls.daemon_log = OutputChecker()
 
-        if os.getenv('VALGRIND') != None:
-            daemon_path = ['valgrind', self.daemon_path, '-v']
-        else:
-            daemon_path = [self.daemon_path, '-v']
-        self.daemon = subprocess.Popen(daemon_path,
-                                       env=env, stdout=self.daemon_log.fd,
-                                       stderr=subprocess.STDOUT)
+        # upowerd only requests its bus name once all objects are exported, so
+        # wait for it to show up; subscribe first to not miss the signal
+        ml = GLib.MainLoop()
+        def name_owner_changed(con, sender, path, iface, signal, params):
+            if params[2]:
+                ml.quit()
+        sub_id = self.dbus.signal_subscribe('org.freedesktop.DBus', 'org.freedesktop.DBus',
+                                            'NameOwnerChanged', '/org/freedesktop/DBus',
+                                            UP, Gio.DBusSignalFlags.NONE,
+                                            name_owner_changed)
+
+        # Use a full executable path and keep close_fds off (all our own fds
+        # are non-inheritable anyway), so that subprocess can use the cheaper
+        # posix_spawn() instead of fork() + exec()
+        cls.daemon = subprocess.Popen(daemon_path,
+                                      env=env, stdout=self.daemon_log.fd,
+                                      stderr=subprocess.STDOUT,
+                                      close_fds=False)
+        cls.daemon_config = config
         self.daemon_log.writer_attached()
+
         # wait until the daemon gets online
-        timeout = 100
-        while timeout > 0:
-            time.sleep(0.1)
-            timeout -= 1
-            try:
-                self.get_dbus_property('DaemonVersion')
-                break
-            except GLib.GError:
-                pass
-        else:
+        timed_out = False
+        def timeout_cb():
+            nonlocal timed_out
+            timed_out = True
+            ml.quit()
+            return GLib.SOURCE_REMOVE
+        timeout_id = GLib.timeout_add_seconds(10, timeout_cb)
+        # the match rule is active once the bus replied to this
+        has_owner = self.dbus.call_sync('org.freedesktop.DBus', '/org/freedesktop/DBus',
+                                        'org.freedesktop.DBus', 'NameHasOwner',
+                                        GLib.Variant('(s)', (UP,)), None,
+                                        Gio.DBusCallFlags.NONE, -1, None).unpack()[0]
+        if not has_owner:
+            ml.run()
+        self.dbus.signal_unsubscribe(sub_id)
+        if timed_out:
             self.fail('daemon did not start in 10 seconds')
+        GLib.source_remove(timeout_id)
 
-        self.proxy = Gio.DBusProxy.new_sync(
+        cls.proxy = Gio.DBusProxy.new_sync(
             self.dbus, Gio.DBusProxyFlags.DO_NOT_AUTO_START, None, UP,
             '/org/freedesktop/UPower', UP, None)
 
         self.assertEqual(self.daemon.poll(), None, 'daemon crashed')
 
-    def stop_daemon(self):
+    @classmethod
+    def get_config_file(cls, **options):
+        '''Get a daemon configuration file with the given [UPower] options.
+
+        The file is only written once per test class and set of options.
+        '''
+        key = tuple(sorted(options.items()))
+        try:
+            return cls.config_files[key]
+        except KeyError:
+            pass
+
+        path = os.path.join(cls.tmpdir, 'UPower-%i.conf' % len(cls.config_files))
+        with open(path, 'w') as f:
+            f.write('[UPower]\n')
+            for k, v in options.items():
+                f.write(f'{k}={v}\n')
+        cls.config_files[key] = path
+        return path
+
+    @classmethod
+    def stop_daemon(cls):
         '''Stop the daemon if it is running.'''
 
-        if self.daemon:
+        daemon = cls.daemon
+        cls.daemon = None
+        cls.daemon_config = None
+        cls.proxy = None
+        if daemon:
             try:
-                self.daemon.terminate()
+                daemon.terminate()
             except OSError:
                 pass
             try:
-                self.assertEqual(self.daemon.wait(timeout=5.0), 0)
+                ret = daemon.wait(timeout=5.0)
             except subprocess.TimeoutExpired:
                 try:
-                    self.daemon.kill()
+                    daemon.kill()
                 except OSError:
                     pass
-                self.assertEqual(self.daemon.wait(), 0)
-            self.daemon_log.assert_closed()
-        self.daemon = None
-        self.proxy = None
+                ret = daemon.wait()
+            shutil.rmtree(cls.daemon_tmpdir)
+            if ret != 0:
+                raise AssertionError('daemon exited with status %i' % ret)
+            cls.daemon_log.assert_closed()
 
-    def get_dbus_property(self, name):
-        '''Get property value from daemon D-Bus interface.'''
+    def call_dbus_properties(self, path, method, args):
+        '''Call org.freedesktop.DBus.Properties method on an upowerd object.
+
+        This goes straight through the bus connection, so there is no proxy
+        (and hence no introspection or name owner lookup) involved.
+        '''
 
-        return self.dbus.call_sync(UP, '/org/freedesktop/UPower',
+        return self.dbus.call_sync(UP, path,
                                    'org.freedesktop.DBus.Properties',
-                                   'Get', GLib.Variant('(ss)', (UP, name)),
+                                   method, args,
                                    None,
                                    Gio.DBusCallFlags.NO_AUTO_START,
                                    -1, None).unpack()[0]
 
+    def get_dbus_property(self, name):
+        '''Get property value from daemon D-Bus interface.'''
+
+        return self.call_dbus_properties('/org/freedesktop/UPower', 'Get',
+                                         GLib.Variant('(ss)', (UP, name)))
+
     def get_dbus_display_property(self, name):
         '''Get property value from display device D-Bus interface.'''
 
-        return self.dbus.call_sync(UP, UP_DISPLAY_OBJECT_PATH,
-                                   'org.freedesktop.DBus.Properties',
-                                   'Get', GLib.Variant('(ss)', (UP_DEVICE, name)),
-                                   None,
-                                   Gio.DBusCallFlags.NO_AUTO_START,
-                                   -1, None).unpack()[0]
+        return self.get_dbus_dev_property(UP_DISPLAY_OBJECT_PATH, name)
 
     def get_dbus_dev_property(self, device, name):
         '''Get property value from an upower device D-Bus path.'''
 
-        return self.dbus.call_sync(UP, device,
-                                   'org.freedesktop.DBus.Properties',
-                                   'Get', GLib.Variant('(ss)', (UP_DEVICE, name)),
-                                   None,
-                                   Gio.DBusCallFlags.NO_AUTO_START,
-                                   -1, None).unpack()[0]
+        return self.call_dbus_properties(device, 'Get',
+                                         GLib.Variant('(ss)', (UP_DEVICE, name)))
+
+    def wait_for_dbus_dev_property(self, device, name, value, timeout=20):
+        '''Wait for a property of an upower device D-Bus path to get a value.
+
+        Timeout is in deciseconds, like for assertEventually().
+        '''
+        self.assertEventually(lambda: self.get_dbus_dev_property(device, name),
+                              value=value, timeout=timeout,
+                              message=f'{device} property {name} did not become {value}')
 
     def get_dbus_dev_properties(self, device):
         '''Get property values from an upower device D-Bus path.'''
 
-        return self.dbus.call_sync(UP, device,
-                                   'org.freedesktop.DBus.Properties',
-                                   'GetAll', GLib.Variant('(s)', (UP_DEVICE,)),
-                                   None,
-                                   Gio.DBusCallFlags.NO_AUTO_START,
-                                   -1, None).unpack()[0]
+        return self.call_dbus_properties(device, 'GetAll',
+                                         GLib.Variant('(s)', (UP_DEVICE,)))
+
+    def _add_devices(self, devices):
+        '''Add several devices to the testbed at once.
+
+        devices is a list of (subsystem, name, attributes, properties) tuples
+        like the arguments of UMockdev.Testbed.add_device(), with attributes
+        and properties as dicts. Return the list of sysfs paths.
+        '''
+        def escape(value):
+            return value.replace('\\', '\\\\').replace('\n', '\\n')
+
+        records = []
+        for subsystem, name, attributes, properties in devices:
+            record = [f'P: /devices/{name}', f'E: SUBSYSTEM={subsystem}']
+            record += [f'E: {k}={v}' for k, v in properties.items()]
+            record += [f'A: {k}={escape(v)}' for k, v in attributes.items()]
+            records.append('\n'.join(record) + '\n')
+        self.testbed.add_from_string('\n'.join(records))
+
+        return [f'/sys/devices/{d[1]}' for d in devices]
+
+    def _assert_generic_battery_device(self, props):
+        '''Check the properties which every present system battery has.'''
+
+        self.assertEqual(props['IsPresent'], True)
+        self.assertEqual(props['PowerSupply'], True)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_BATTERY)
 
     def assertDevs(self, expected):
         devs = self.proxy.EnumerateDevices()
@@ -293,15 +576,25 @@ class Tests(dbusmock.DBusTestCase):
             for k, v in expected[n].items():
                 self.assertEqual(props[k], v, msg=f'Property "{k}" of "{n}" should be {v} but is {props[k]}')
 
-    def start_logind(self, parameters=None):
-        self.logind, self.logind_obj = self.spawn_server_template('logind',
-                                                                  parameters or {})
-        self.addCleanup(self.stop_process, self.logind)
+    @classmethod
+    def start_logind(cls, parameters=None):
+        cls.logind_parameters = parameters or {}
+        cls.logind, cls.logind_obj = cls.spawn_server_template('logind',
+                                                               cls.logind_parameters)
+
+    def reset_logind(self):
+        '''Reset the logind mock to its initial state, e.g. drop inhibitors.
+
+        Only do this while the daemon is not running.
+        '''
 
-    def start_bluez(self, parameters=None):
-        self.bluez, self.bluez_obj = self.spawn_server_template('bluez5',
-                                                                  parameters or {})
-        self.addCleanup(self.stop_process, self.bluez)
+        try:
+            self.logind_obj.Reset(dbus_interface=dbusmock.MOCK_IFACE)
+        except dbus.exceptions.DBusException:
+            # dbusmock too old for Reset(), start a new one
+            cls = type(self)
+            cls.stop_process(cls.logind)
+            cls.start_logind(cls.logind_parameters)
 
     def assertEventually(self, condition, message=None, timeout=50, value=True):
         '''Assert that condition function eventually returns True.
@@ -309,23 +602,96 @@ class Tests(dbusmock.DBusTestCase):
         Timeout is in deciseconds, defaulting to 50 (5 seconds). message is
         printed on failure.
         '''
-        while timeout >= 0:
-            context = GLib.MainContext.default()
+        context = GLib.MainContext.default()
+        deadline = time.monotonic() + timeout / 10.0
+        # Block in the main context rather than sleeping, so that we re-check
+        # as soon as any property changes (the PropertiesChanged subscription
+        # from setUpClass() lives for the whole class); for conditions which
+        # are not tied to a signal, wake up with an exponential backoff from
+        # 5 to 100 ms.
+        interval = 5
+        while True:
             while context.iteration(False):
                 pass
             if condition() == value:
+                return
+            if time.monotonic() >= deadline:
                 break
-            timeout -= 1
-            time.sleep(0.1)
-        else:
-            self.fail(message or 'timed out waiting for ' + str(condition))
 
+            fired = []
+            wakeup_id = GLib.timeout_add(interval, lambda: fired.append(True))
+            context.iteration(True)
+            if not fired:
+                GLib.source_remove(wakeup_id)
+            interval = min(interval * 2, 100)
+
+        self.fail(message or 'timed out waiting for ' + str(condition))
+
+    def wait_for_devices(self, count, timeout=50):
+        '''Wait until upowerd exports count devices, and return them
+
+        This enumerates the devices once and then follows the DeviceAdded and
+        DeviceRemoved signals. Timeout is in deciseconds, like for
+        assertEventually().
+        '''
+        context = GLib.MainContext.default()
+        devs = []
+
+        def device_signal(bus, sender, path, iface, signal, params):
+            if signal == 'DeviceAdded' and params[0] not in devs:
+                devs.append(params[0])
+            elif signal == 'DeviceRemoved' and params[0] in devs:
+                devs.remove(params[0])
+
+        timed_out = []
+        def on_timeout():
+            timed_out.append(True)
+            return GLib.SOURCE_REMOVE
+
+        # subscribe first to not miss a change while enumerating; signals
+        # about already enumerated devices are harmless
+        sub_id = self.dbus.signal_subscribe(None, UP, None, '/org/freedesktop/UPower',
+                                            None, Gio.DBusSignalFlags.NONE, device_signal)
+        timeout_id = GLib.timeout_add(timeout * 100, on_timeout)
+        try:
+            devs[:] = self.proxy.EnumerateDevices()
+            while len(devs) != count and not timed_out:
+                context.iteration(True)
+        finally:
+            if not timed_out:
+                GLib.source_remove(timeout_id)
+            self.dbus.signal_unsubscribe(sub_id)
+
+        self.assertEqual(len(devs), count, f'timed out waiting for {count} devices, got {devs}')
+        return devs
+
+    def _add_bt_mouse(self):
+        '''Add a bluetooth mouse to testbed'''
+
+        return self._add_devices([
+            ('bluetooth', 'usb1/bluetooth/hci0/hci0:01', {}, {}),
+            ('input', 'usb1/bluetooth/hci0/hci0:01/input2/mouse3', {},
+             {'DEVNAME': 'input/mouse3', 'ID_INPUT_MOUSE': '1'}),
+            ('power_supply',
+             'usb1/bluetooth/hci0/hci0:01/1/power_supply/hid-00:11:22:33:44:55-battery',
+             {'type': 'Battery',
+              'scope': 'Device',
+              'present': '1',
+              'online': '1',
+              'status': 'Discharging',
+              'capacity': '30',
+              'model_name': 'Fancy BT mouse'},
+             {}),
+        ])[-1]
+
+
+class Tests(UPowerTestCase):
     #
     # Actual test cases
     #
 
     def test_daemon_version(self):
-        '''DaemonVersion property'''
+        '''DaemonVersion property, no devices'''
 
         self.start_daemon()
         self.assertEqual(self.proxy.EnumerateDevices(), [])
@@ -334,16 +700,6 @@ class Tests(dbusmock.DBusTestCase):
         # without any devices we should assume AC
         self.assertEqual(self.get_dbus_property('OnBattery'), False)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.stop_daemon()
-
-    def test_no_devices(self):
-        '''no devices'''
-
-        # without any devices we should assume AC
-        self.start_daemon()
-        self.assertEqual(self.get_dbus_property('OnBattery'), False)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.stop_daemon()
 
     def test_props_online_ac(self):
         '''properties with online AC'''
@@ -358,10 +714,11 @@ class Tests(dbusmock.DBusTestCase):
         self.assertTrue('line_power_AC' in ac_up)
         self.assertEqual(self.get_dbus_property('OnBattery'), False)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.assertEqual(self.get_dbus_dev_property(ac_up, 'PowerSupply'), True)
-        self.assertEqual(self.get_dbus_dev_property(ac_up, 'Type'), UP_DEVICE_KIND_LINE_POWER)
-        self.assertEqual(self.get_dbus_dev_property(ac_up, 'Online'), True)
-        self.assertEqual(self.get_dbus_dev_property(ac_up, 'NativePath'), 'AC')
+        props = self.get_dbus_dev_properties(ac_up)
+        self.assertEqual(props['PowerSupply'], True)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_LINE_POWER)
+        self.assertEqual(props['Online'], True)
+        self.assertEqual(props['NativePath'], 'AC')
         self.stop_daemon()
 
     def test_props_offline_ac(self):
@@ -381,62 +738,54 @@ class Tests(dbusmock.DBusTestCase):
     def test_macbook_capacity(self):
         '''MacBooks have incorrect sysfs capacity'''
 
-        ac = self.testbed.add_device('power_supply', 'AC', None,
-                                     ['type', 'Mains', 'online', '0'], [])
-        bat0 = self.testbed.add_device('power_supply', 'BAT0', None,
-                                       ['type', 'Battery',
-                                        'present', '1',
-                                        'status', 'Discharging',
-                                        'capacity', '60',
-                                        'energy_full', '60000000',
-                                        'energy_full_design', '80000000',
-                                        'energy_now', '48000000',
-                                        'voltage_now', '12000000'], [])
-        self.testbed.add_device('virtual', 'virtual/dmi', None,
-                                ['id/product_name', 'MacBookAir7,2'], [])
+        ac, bat0, _ = self._add_devices([
+            ('power_supply', 'AC', {'type': 'Mains', 'online': '0'}, {}),
+            ('power_supply', 'BAT0', {'type': 'Battery',
+                                      'present': '1',
+                                      'status': 'Discharging',
+                                      'capacity': '60',
+                                      'energy_full': '60000000',
+                                      'energy_full_design': '80000000',
+                                      'energy_now': '48000000',
+                                      'voltage_now': '12000000'}, {}),
+            ('virtual', 'virtual/dmi', {'id/product_name': 'MacBookAir7,2'}, {}),
+        ])
         self.start_daemon()
         devs = self.proxy.EnumerateDevices()
         self.assertEqual(len(devs), 2)
-        if 'BAT' in devs[0] == ac_up:
-            (bat0_up, ac_up) = devs
-        else:
-            (ac_up, bat0_up) = devs
+        (bat0_up, ac_up) = sorted(devs, key=lambda p: 'BAT' not in p)
 
         self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), 80)
 
     def test_macbook_uevent(self):
         '''MacBooks sent uevent 5 seconds before battery updates'''
 
-        ac = self.testbed.add_device('power_supply', 'AC', None,
-                                     ['type', 'Mains', 'online', '0'], [])
-        bat0 = self.testbed.add_device('power_supply', 'BAT0', None,
-                                       ['type', 'Battery',
-                                        'present', '1',
-                                        'status', 'Discharging',
-                                        'energy_full', '60000000',
-                                        'energy_full_design', '80000000',
-                                        'energy_now', '48000000',
-                                        'voltage_now', '12000000'], [])
-        self.testbed.add_device('virtual', 'virtual/dmi', None,
-                                ['id/product_name', 'MacBookAir7,2'], [])
+        ac, bat0, _ = self._add_devices([
+            ('power_supply', 'AC', {'type': 'Mains', 'online': '0'}, {}),
+            ('power_supply', 'BAT0', {'type': 'Battery',
+                                      'present': '1',
+                                      'status': 'Discharging',
+                                      'energy_full': '60000000',
+                                      'energy_full_design': '80000000',
+                                      'energy_now': '48000000',
+                                      'voltage_now': '12000000'}, {}),
+            ('virtual', 'virtual/dmi', {'id/product_name': 'MacBookAir7,2'}, {}),
+        ])
         self.start_daemon()
         devs = self.proxy.EnumerateDevices()
         self.assertEqual(len(devs), 2)
-        if 'BAT' in devs[0] == ac_up:
-            (bat0_up, ac_up) = devs
-        else:
-            (ac_up, bat0_up) = devs
+        (bat0_up, ac_up) = sorted(devs, key=lambda p: 'BAT' not in p)
 
         self.assertEqual(self.get_dbus_dev_property(bat0_up, 'State'), UP_DEVICE_STATE_DISCHARGING)
 
-        self.testbed.set_attribute(ac, 'online', '1')
-        self.testbed.uevent(ac, 'change')
+        self.testbed_update(ac, {'online': '1'})
         self.assertEqual(self.get_dbus_dev_property(bat0_up, 'State'), UP_DEVICE_STATE_DISCHARGING)
+        # the daemon must still be polling a few seconds after the uevent
         time.sleep(3)
         self.testbed.set_attribute(bat0, 'status', 'Charging')
-        time.sleep(1)
 
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'State'), UP_DEVICE_STATE_CHARGING)
+        self.assertEventually(lambda: self.get_dbus_dev_property(bat0_up, 'State'),
+                              value=UP_DEVICE_STATE_CHARGING, timeout=20)
 
         # We stopped polling now, so this update will *not* be read, even if
         # we send a new uevent, as the 'online' state does not change.
@@ -450,82 +799,70 @@ class Tests(dbusmock.DBusTestCase):
         '''properties with dynamic battery/AC'''
 
         # offline AC + discharging battery
-        ac = self.testbed.add_device('power_supply', 'AC', None,
-                                     ['type', 'Mains', 'online', '0'], [])
-        bat0 = self.testbed.add_device('power_supply', 'BAT0', None,
-                                       ['type', 'Battery',
-                                        'present', '1',
-                                        'status', 'Discharging',
-                                        'energy_full', '60000000',
-                                        'energy_full_design', '80000000',
-                                        'energy_now', '48000000',
-                                        'voltage_now', '12000000'], [])
+        ac, bat0 = self._add_devices([
+            ('power_supply', 'AC', {'type': 'Mains', 'online': '0'}, {}),
+            ('power_supply', 'BAT0', {'type': 'Battery',
+                                      'present': '1',
+                                      'status': 'Discharging',
+                                      'energy_full': '60000000',
+                                      'energy_full_design': '80000000',
+                                      'energy_now': '48000000',
+                                      'voltage_now': '12000000'}, {}),
+        ])
 
         self.start_daemon()
         devs = self.proxy.EnumerateDevices()
         self.assertEqual(len(devs), 2)
-        if 'BAT' in devs[0] == ac_up:
-            (bat0_up, ac_up) = devs
-        else:
-            (ac_up, bat0_up) = devs
+        (bat0_up, ac_up) = sorted(devs, key=lambda p: 'BAT' not in p)
 
         # we don't have any known online power device now, but still no battery
         self.assertEqual(self.get_dbus_property('OnBattery'), True)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'IsPresent'), True)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'State'), UP_DEVICE_STATE_DISCHARGING)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), 80.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Energy'), 48.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'EnergyFull'), 60.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'EnergyFullDesign'), 80.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Voltage'), 12.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'NativePath'), 'BAT0')
-        self.stop_daemon()
+        props = self.get_dbus_dev_properties(bat0_up)
+        self._assert_generic_battery_device(props)
+        self.assertEqual(props['State'], UP_DEVICE_STATE_DISCHARGING)
+        self.assertEqual(props['Percentage'], 80.0)
+        self.assertEqual(props['Energy'], 48.0)
+        self.assertEqual(props['EnergyFull'], 60.0)
+        self.assertEqual(props['EnergyFullDesign'], 80.0)
+        self.assertEqual(props['Voltage'], 12.0)
+        self.assertEqual(props['NativePath'], 'BAT0')
 
         # offline AC + discharging low battery
-        self.testbed.set_attribute(bat0, 'energy_now', '1500000')
-        self.start_daemon()
+        self.testbed_update(bat0, {'energy_now': '1500000'})
+        self.assertEventually(lambda: self.get_dbus_dev_property(bat0_up, 'Percentage'), value=2.5)
         self.assertEqual(self.get_dbus_property('OnBattery'), True)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_CRITICAL)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'IsPresent'), True)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'State'), UP_DEVICE_STATE_DISCHARGING)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), 2.5)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'PowerSupply'), True)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Type'), UP_DEVICE_KIND_BATTERY)
-        self.stop_daemon()
+        props = self.get_dbus_dev_properties(bat0_up)
+        self.assertEqual(props['State'], UP_DEVICE_STATE_DISCHARGING)
+        self.assertEqual(props['Percentage'], 2.5)
 
         # now connect AC again
-        self.testbed.set_attribute(ac, 'online', '1')
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 2)
-        # we don't have any known online power device now, but still no battery
+        self.testbed_update(ac, {'online': '1'})
+        self.assertEventually(lambda: self.get_dbus_dev_property(ac_up, 'Online'), value=True)
         self.assertEqual(self.get_dbus_property('OnBattery'), False)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.assertEqual(self.get_dbus_dev_property(ac_up, 'Online'), True)
-        self.stop_daemon()
 
     def test_multiple_batteries(self):
         '''Multiple batteries'''
 
         # one well charged, one low
-        bat0 = self.testbed.add_device('power_supply', 'BAT0', None,
-                                       ['type', 'Battery',
-                                        'present', '1',
-                                        'status', 'Discharging',
-                                        'energy_full', '60000000',
-                                        'energy_full_design', '80000000',
-                                        'energy_now', '48000000',
-                                        'voltage_now', '12000000'], [])
-
-        self.testbed.add_device('power_supply', 'BAT1', None,
-                                ['type', 'Battery',
-                                 'present', '1',
-                                 'status', 'Discharging',
-                                 'energy_full', '60000000',
-                                 'energy_full_design', '80000000',
-                                 'energy_now', '1500000',
-                                 'voltage_now', '12000000'], [])
+        bat0, _ = self._add_devices([
+            ('power_supply', 'BAT0', {'type': 'Battery',
+                                      'present': '1',
+                                      'status': 'Discharging',
+                                      'energy_full': '60000000',
+                                      'energy_full_design': '80000000',
+                                      'energy_now': '48000000',
+                                      'voltage_now': '12000000'}, {}),
+            ('power_supply', 'BAT1', {'type': 'Battery',
+                                      'present': '1',
+                                      'status': 'Discharging',
+                                      'energy_full': '60000000',
+                                      'energy_full_design': '80000000',
+                                      'energy_now': '1500000',
+                                      'voltage_now': '12000000'}, {}),
+        ])
 
         self.start_daemon()
         devs = self.proxy.EnumerateDevices()
@@ -706,14 +1043,10 @@ class Tests(dbusmock.DBusTestCase):
                                         'capacity', '40',
                                         'voltage_now', '12000000'], [])
 
-        config = tempfile.NamedTemporaryFile(delete=False, mode='w')
         # The unknown poll can cause issues for test synchronization
-        config.write("[UPower]\n")
-        config.write("NoPollBatteries=true\n")
-        config.close()
-        self.addCleanup(os.unlink, config.name)
+        config = self.get_config_file(NoPollBatteries='true')
 
-        self.start_daemon(config.name, warns=True)
+        self.start_daemon(config, warns=True)
         devs = self.proxy.EnumerateDevices()
         self.assertEqual(len(devs), 2)
 
@@ -834,14 +1167,14 @@ class Tests(dbusmock.DBusTestCase):
 
         self.assertEqual(self.get_dbus_property('OnBattery'), True)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'IsPresent'), True)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'State'), UP_DEVICE_STATE_DISCHARGING)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), 75.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Energy'), 94.5)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'EnergyFull'), 126.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'EnergyFullDesign'), 132.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Voltage'), 12.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Temperature'), 0.0)
+        props = self.get_dbus_dev_properties(bat0_up)
+        self.assertEqual(props['State'], UP_DEVICE_STATE_DISCHARGING)
+        self.assertEqual(props['Percentage'], 75.0)
+        self.assertEqual(props['Energy'], 94.5)
+        self.assertEqual(props['EnergyFull'], 126.0)
+        self.assertEqual(props['EnergyFullDesign'], 132.0)
+        self.assertEqual(props['Voltage'], 12.0)
+        self.assertEqual(props['Temperature'], 0.0)
         self.stop_daemon()
 
     def test_battery_energy_charge_mixed(self):
@@ -864,44 +1197,13 @@ class Tests(dbusmock.DBusTestCase):
 
         self.assertEqual(self.get_dbus_property('OnBattery'), True)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'IsPresent'), True)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'State'), UP_DEVICE_STATE_DISCHARGING)
-        self.assertAlmostEqual(self.get_dbus_dev_property(bat0_up, 'Energy'), 50.4)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'EnergyFull'), 126.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'EnergyFullDesign'), 132.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Voltage'), 12.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), 40.0)
-        self.stop_daemon()
-
-    def test_battery_capacity_and_charge(self):
-        '''battery which reports capacity and charge_full'''
-
-        self.testbed.add_device('power_supply', 'BAT0', None,
-                                ['type', 'Battery',
-                                 'present', '1',
-                                 'status', 'Discharging',
-                                 'charge_full', '10500000',
-                                 'charge_full_design', '11000000',
-                                 'capacity', '40',
-                                 'voltage_now', '12000000'], [])
-
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 1)
-        bat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), 40.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'IsPresent'), True)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'State'), UP_DEVICE_STATE_DISCHARGING)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Energy'), 50.4)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'EnergyFull'), 126.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'EnergyFullDesign'), 132.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Voltage'), 12.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'PowerSupply'), True)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Type'), UP_DEVICE_KIND_BATTERY)
-
-        self.assertEqual(self.get_dbus_property('OnBattery'), True)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
+        props = self.get_dbus_dev_properties(bat0_up)
+        self.assertEqual(props['State'], UP_DEVICE_STATE_DISCHARGING)
+        self.assertAlmostEqual(props['Energy'], 50.4)
+        self.assertEqual(props['EnergyFull'], 126.0)
+        self.assertEqual(props['EnergyFullDesign'], 132.0)
+        self.assertEqual(props['Voltage'], 12.0)
+        self.assertEqual(props['Percentage'], 40.0)
         self.stop_daemon()
 
     def test_battery_overfull(self):
@@ -925,44 +1227,16 @@ class Tests(dbusmock.DBusTestCase):
         bat0_up = devs[0]
 
         # should clamp percentage
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), 100.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'IsPresent'), True)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'State'),
-                         UP_DEVICE_STATE_FULLY_CHARGED)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Energy'), 132.0)
+        props = self.get_dbus_dev_properties(bat0_up)
+        self.assertEqual(props['Percentage'], 100.0)
+        self.assertEqual(props['State'], UP_DEVICE_STATE_FULLY_CHARGED)
+        self.assertEqual(props['Energy'], 132.0)
         # should adjust EnergyFull to reality, not what the battery claims
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'EnergyFull'), 132.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'EnergyFullDesign'), 132.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Voltage'), 12.0)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'PowerSupply'), True)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Type'), UP_DEVICE_KIND_BATTERY)
+        self.assertEqual(props['EnergyFull'], 132.0)
+        self.assertEqual(props['EnergyFullDesign'], 132.0)
+        self.assertEqual(props['Voltage'], 12.0)
         # capacity_level is unused because a 'capacity' attribute is present and used instead
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'BatteryLevel'), UP_DEVICE_LEVEL_NONE)
-        self.stop_daemon()
-
-    def test_battery_temperature(self):
-        '''battery which reports temperature'''
-
-        self.testbed.add_device('power_supply', 'BAT0', None,
-                                ['type', 'Battery',
-                                 'present', '1',
-                                 'status', 'Discharging',
-                                 'temp', '254',
-                                 'energy_full', '60000000',
-                                 'energy_full_design', '80000000',
-                                 'energy_now', '1500000',
-                                 'voltage_now', '12000000'], [])
-
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 1)
-        bat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Temperature'), 25.4)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), 2.5)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Energy'), 1.5)
-        self.assertEqual(self.get_dbus_property('OnBattery'), True)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_CRITICAL)
+        self.assertEqual(props['BatteryLevel'], UP_DEVICE_LEVEL_NONE)
         self.stop_daemon()
 
     def test_battery_broken_name(self):
@@ -981,37 +1255,13 @@ class Tests(dbusmock.DBusTestCase):
         self.assertEqual(self.get_dbus_display_property('IsPresent'), True)
         self.stop_daemon()
 
-    def test_battery_zero_power_draw(self):
-        '''Battery with zero power draw, e.g. in a dual-battery system'''
-
-        self.testbed.add_device('power_supply', 'BAT0', None,
-                                ['type', 'Battery',
-                                 'present', '1',
-                                 'status', 'Full',
-                                 'energy_full', '60000000',
-                                 'energy_full_design', '80000000',
-                                 'energy_now', '60000000',
-                                 'voltage_now', '12000000',
-                                 'power_now', '0',
-                                 'current_now', '787000'], [])
-
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 1)
-        bat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'EnergyRate'), 0.0)
-        self.stop_daemon()
-
     def test_ups_no_ac(self):
         '''UPS properties without AC'''
 
         # add a charging UPS
         ups0 = self.testbed.add_device('usbmisc', 'hiddev0', None, [],
-                                       ['DEVNAME', 'null', 'UPOWER_VENDOR', 'APC',
-                                        'UPOWER_BATTERY_TYPE', 'ups',
-                                        'UPOWER_FAKE_DEVICE', '1',
-                                        'UPOWER_FAKE_HID_CHARGING', '1',
+                                       list(UPS_PROPERTIES) +
+                                       ['UPOWER_FAKE_HID_CHARGING', '1',
                                         'UPOWER_FAKE_HID_PERCENTAGE', '70'])
 
         self.start_daemon()
@@ -1019,12 +1269,13 @@ class Tests(dbusmock.DBusTestCase):
         self.assertEqual(len(devs), 1)
         ups0_up = devs[0]
 
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'Vendor'), 'APC')
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'IsPresent'), True)
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'Percentage'), 70.0)
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'State'), UP_DEVICE_STATE_CHARGING)
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'PowerSupply'), True)
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'Type'), UP_DEVICE_KIND_UPS)
+        props = self.get_dbus_dev_properties(ups0_up)
+        self.assertEqual(props['Vendor'], 'APC')
+        self.assertEqual(props['IsPresent'], True)
+        self.assertEqual(props['Percentage'], 70.0)
+        self.assertEqual(props['State'], UP_DEVICE_STATE_CHARGING)
+        self.assertEqual(props['PowerSupply'], True)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_UPS)
 
         self.assertEqual(self.get_dbus_property('OnBattery'), False)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
@@ -1038,9 +1289,9 @@ class Tests(dbusmock.DBusTestCase):
         self.assertEqual(len(devs), 1)
         self.assertEqual(devs[0], ups0_up)
 
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'IsPresent'), True)
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'Percentage'), 70.0)
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'State'), UP_DEVICE_STATE_DISCHARGING)
+        props = self.get_dbus_dev_properties(ups0_up)
+        self.assertEqual(props['Percentage'], 70.0)
+        self.assertEqual(props['State'], UP_DEVICE_STATE_DISCHARGING)
         self.assertEqual(self.get_dbus_property('OnBattery'), True)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_DISCHARGING)
         self.stop_daemon()
@@ -1048,8 +1299,9 @@ class Tests(dbusmock.DBusTestCase):
         # low UPS charge
         self.testbed.set_property(ups0, 'UPOWER_FAKE_HID_PERCENTAGE', '2')
         self.start_daemon()
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'Percentage'), 2.0)
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'State'), UP_DEVICE_STATE_DISCHARGING)
+        props = self.get_dbus_dev_properties(ups0_up)
+        self.assertEqual(props['Percentage'], 2.0)
+        self.assertEqual(props['State'], UP_DEVICE_STATE_DISCHARGING)
         self.assertEqual(self.get_dbus_property('OnBattery'), True)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_ACTION)
         self.stop_daemon()
@@ -1059,10 +1311,8 @@ class Tests(dbusmock.DBusTestCase):
 
         # add low charge UPS
         ups0 = self.testbed.add_device('usbmisc', 'hiddev0', None, [],
-                                       ['DEVNAME', 'null', 'UPOWER_VENDOR', 'APC',
-                                        'UPOWER_BATTERY_TYPE', 'ups',
-                                        'UPOWER_FAKE_DEVICE', '1',
-                                        'UPOWER_FAKE_HID_CHARGING', '0',
+                                       list(UPS_PROPERTIES) +
+                                       ['UPOWER_FAKE_HID_CHARGING', '0',
                                         'UPOWER_FAKE_HID_PERCENTAGE', '2'])
         # add an offline AC, should still be on battery
         ac = self.testbed.add_device('power_supply', 'AC', None,
@@ -1076,8 +1326,9 @@ class Tests(dbusmock.DBusTestCase):
 
         self.assertEqual(len(devs), 2)
 
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'Percentage'), 2.0)
-        self.assertEqual(self.get_dbus_dev_property(ups0_up, 'State'), UP_DEVICE_STATE_DISCHARGING)
+        props = self.get_dbus_dev_properties(ups0_up)
+        self.assertEqual(props['Percentage'], 2.0)
+        self.assertEqual(props['State'], UP_DEVICE_STATE_DISCHARGING)
         self.assertEqual(self.get_dbus_property('OnBattery'), True)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_ACTION)
         self.stop_daemon()
@@ -1126,7 +1377,7 @@ class Tests(dbusmock.DBusTestCase):
 
         self.stop_daemon()
 
-    @unittest.skipIf(parse_version(dbusmock.__version__) <= parse_version('0.23.1'), 'Not supported in dbusmock version')
+    @unittest.skipUnless(DBUSMOCK_GE_0_23_2, 'Not supported in dbusmock version')
     def test_prevent_sleep_until_critical_action_is_executed(self):
         '''check that critical action is executed when trying to suspend'''
 
@@ -1139,14 +1390,11 @@ class Tests(dbusmock.DBusTestCase):
                                         'energy_now', '50000000',
                                         'voltage_now', '12000000'], [])
 
-        config = tempfile.NamedTemporaryFile(delete=False, mode='w')
-        config.write("[UPower]\n")
-        config.write("UsePercentageForPolicy=true\n")
-        config.write("PercentageAction=5\n")
-        config.write("CriticalPowerAction=Hibernate\n")
-        config.close()
+        config = self.get_config_file(UsePercentageForPolicy='true',
+                                      PercentageAction=5,
+                                      CriticalPowerAction='Hibernate')
 
-        self.start_daemon(cfgfile=config.name)
+        self.start_daemon(cfgfile=config)
 
         # delay inhibitor taken
         self.assertEqual(len(self.logind_obj.ListInhibitors()), 1)
@@ -1156,13 +1404,11 @@ class Tests(dbusmock.DBusTestCase):
         bat0_up = devs[0]
 
         # simulate that battery has 1% (less than PercentageAction)
-        self.testbed.set_attribute(bat0, 'energy_now', '600000')
-        self.testbed.uevent(bat0, 'change')
+        self.testbed_update(bat0, {'energy_now': '600000'})
 
         # critical action is scheduled, a block inhibitor lock is taken besides a delay inhibitor lock
-        time.sleep(0.5)
         self.assertEventually(lambda: self.get_dbus_display_property('WarningLevel'), value=UP_DEVICE_LEVEL_ACTION)
-        self.assertEqual(len(self.logind_obj.ListInhibitors()), 2)
+        self.assertEventually(lambda: len(self.logind_obj.ListInhibitors()), value=2)
 
         self.daemon_log.check_line("About to call logind method Hibernate", timeout=UP_DAEMON_ACTION_DELAY + 0.5)
 
@@ -1181,48 +1427,37 @@ class Tests(dbusmock.DBusTestCase):
                                         'energy_now', '50000000',
                                         'voltage_now', '12000000'], [])
 
-        config = tempfile.NamedTemporaryFile(delete=False, mode='w')
-        config.write("[UPower]\n")
-        config.write("UsePercentageForPolicy=true\n")
-        config.write("PercentageAction=5\n")
-        config.write("CriticalPowerAction=Hibernate\n")
-        config.close()
+        config = self.get_config_file(UsePercentageForPolicy='true',
+                                      PercentageAction=5,
+                                      CriticalPowerAction='Hibernate')
 
-        self.start_daemon(cfgfile=config.name)
+        self.start_daemon(cfgfile=config)
 
         devs = self.proxy.EnumerateDevices()
         self.assertEqual(len(devs), 1)
         bat0_up = devs[0]
 
         # simulate that battery has 1% (less than PercentageAction)
-        self.testbed.set_attribute(bat0, 'energy_now', '600000')
-        self.testbed.uevent(bat0, 'change')
+        self.testbed_update(bat0, {'energy_now': '600000'})
 
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_ACTION)
+        self.assertEventually(lambda: self.get_dbus_display_property('WarningLevel'), value=UP_DEVICE_LEVEL_ACTION)
 
         self.daemon_log.check_line("About to call logind method Hibernate", timeout=UP_DAEMON_ACTION_DELAY + 0.5)
 
         # simulate that battery was charged to 100% during sleep
-        self.testbed.set_attribute(bat0, 'energy_now', '60000000')
-        self.testbed.uevent(bat0, 'change')
+        self.testbed_update(bat0, {'energy_now': '60000000'})
 
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
+        self.assertEventually(lambda: self.get_dbus_display_property('WarningLevel'), value=UP_DEVICE_LEVEL_NONE)
 
         # simulate that battery was drained to 1% again
-        self.testbed.set_attribute(bat0, 'energy_now', '600000')
-        self.testbed.uevent(bat0, 'change')
+        self.testbed_update(bat0, {'energy_now': '600000'})
 
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_ACTION)
+        self.assertEventually(lambda: self.get_dbus_display_property('WarningLevel'), value=UP_DEVICE_LEVEL_ACTION)
 
         self.daemon_log.check_line("About to call logind method Hibernate", timeout=UP_DAEMON_ACTION_DELAY + 0.5)
 
         self.stop_daemon()
 
-        os.unlink(config.name)
-
     def test_low_battery_changes_history_save_interval(self):
         '''check that we save the history more quickly on low battery'''
 
@@ -1244,21 +1479,17 @@ class Tests(dbusmock.DBusTestCase):
         self.daemon_log.check_line(f"saving in {UP_HISTORY_SAVE_INTERVAL} seconds", timeout=1)
 
         # simulate that battery has 1% (less than 10%)
-        self.testbed.set_attribute(bat0, 'energy_now', '600000')
-        self.testbed.uevent(bat0, 'change')
+        self.testbed_update(bat0, {'energy_now': '600000'})
 
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_display_property('Percentage'), 1)
+        self.assertEventually(lambda: self.get_dbus_display_property('Percentage'), value=1)
 
         self.daemon_log.check_line("saving to disk earlier due to low power")
         self.daemon_log.check_line(f"saving in {UP_HISTORY_SAVE_INTERVAL_LOW_POWER} seconds")
 
         # simulate that battery was charged to 100% during sleep
-        self.testbed.set_attribute(bat0, 'energy_now', '60000000')
-        self.testbed.uevent(bat0, 'change')
+        self.testbed_update(bat0, {'energy_now': '60000000'})
 
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_display_property('Percentage'), 100)
+        self.assertEventually(lambda: self.get_dbus_display_property('Percentage'), value=100)
 
         # The 5 seconds were not up yet, and the shorter timeout sticks
         self.daemon_log.check_line("deferring as earlier timeout is already queued")
@@ -1285,9 +1516,7 @@ class Tests(dbusmock.DBusTestCase):
         self.daemon_log.check_line(f"using id: Fake_Battery-80-001", timeout=1)
 
         # Change the serial of the battery
-        self.testbed.set_attribute(bat0, 'energy_full_design', '90000000')
-        self.testbed.set_attribute(bat0, 'serial_number', '002')
-        self.testbed.uevent(bat0, 'change')
+        self.testbed_update(bat0, {'energy_full_design': '90000000', 'serial_number': '002'})
 
         # This saves the old history, and then opens a new one
         self.daemon_log.check_line_re(f"saved .*/history-time-empty-Fake_Battery-80-001.dat", timeout=1)
@@ -1297,8 +1526,7 @@ class Tests(dbusmock.DBusTestCase):
         self.daemon_log.check_no_line(f"using id:", wait=1.0)
 
         # Remove the battery
-        self.testbed.set_attribute(bat0, 'present', '0')
-        self.testbed.uevent(bat0, 'change')
+        self.testbed_update(bat0, {'present': '0'})
 
         # This saves the old history, and does *not* open a new one
         self.daemon_log.check_line_re(f"saved .*/history-time-empty-Fake_Battery-90-002.dat", timeout=1)
@@ -1320,15 +1548,12 @@ class Tests(dbusmock.DBusTestCase):
                                         'capacity', '15',
                                         'voltage_now', '12000000'], [])
 
-        config = tempfile.NamedTemporaryFile(delete=False, mode='w')
         # Low, Critical and Action are all needed to avoid fallback to defaults
-        config.write("[UPower]\n")
-        config.write("PercentageLow=20\n")
-        config.write("PercentageCritical=3\n")
-        config.write("PercentageAction=2\n")
-        config.close()
+        config = self.get_config_file(PercentageLow=20,
+                                      PercentageCritical=3,
+                                      PercentageAction=2)
 
-        self.start_daemon(cfgfile=config.name)
+        self.start_daemon(cfgfile=config)
         devs = self.proxy.EnumerateDevices()
         self.assertEqual(len(devs), 1)
         bat0_up = devs[0]
@@ -1341,8 +1566,6 @@ class Tests(dbusmock.DBusTestCase):
 
         self.stop_daemon()
 
-        os.unlink(config.name)
-
     def test_vendor_strings(self):
         '''manufacturer/model_name/serial_number with valid and invalid strings'''
 
@@ -1374,53 +1597,6 @@ class Tests(dbusmock.DBusTestCase):
         self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Energy'), 1.5)
         self.stop_daemon()
 
-    def _add_bt_mouse(self):
-        '''Add a bluetooth mouse to testbed'''
-
-        self.testbed.add_device('bluetooth',
-                                'usb1/bluetooth/hci0/hci0:01',
-                                None,
-                                [], [])
-
-        self.testbed.add_device(
-            'input',
-            'usb1/bluetooth/hci0/hci0:01/input2/mouse3',
-            None,
-            [], ['DEVNAME', 'input/mouse3', 'ID_INPUT_MOUSE', '1'])
-
-        mousebat0 = self.testbed.add_device(
-            'power_supply',
-            'usb1/bluetooth/hci0/hci0:01/1/power_supply/hid-00:11:22:33:44:55-battery',
-            None,
-            ['type', 'Battery',
-             'scope', 'Device',
-             'present', '1',
-             'online', '1',
-             'status', 'Discharging',
-             'capacity', '30',
-             'model_name', 'Fancy BT mouse'],
-            [])
-
-        return mousebat0
-
-    def test_bluetooth_mouse(self):
-        '''bluetooth mouse battery'''
-
-        self._add_bt_mouse()
-
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 1)
-        mousebat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Model'), 'Fancy BT mouse')
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 30)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Type'), UP_DEVICE_KIND_MOUSE)
-        self.assertEqual(self.get_dbus_property('OnBattery'), False)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.stop_daemon()
-
     def test_bluetooth_mouse_reconnect(self):
         '''bluetooth mouse powerdown/reconnect'''
 
@@ -1431,13 +1607,9 @@ class Tests(dbusmock.DBusTestCase):
         self.assertEqual(len(devs_before), 1)
 
         self.testbed.uevent(mb, 'remove')
-        time.sleep(1)
-        self.assertEqual(self.proxy.EnumerateDevices(), [])
+        self.wait_for_devices(0)
         self.testbed.uevent(mb, 'add')
-        time.sleep(0.5)
-
-        devs_after = self.proxy.EnumerateDevices()
-        self.assertEqual(devs_before, devs_after)
+        self.assertEqual(self.wait_for_devices(1), devs_before)
 
         # second add, which should be treated as change
         self.testbed.uevent(mb, 'add')
@@ -1465,326 +1637,137 @@ class Tests(dbusmock.DBusTestCase):
             [])
 
         self.testbed.uevent(mb1, 'add')
-        time.sleep(0.5)
+        mb1_up = devs_before[0]
+        self.wait_for_dbus_dev_property(mb1_up, 'Percentage', 20)
 
         devs_after = self.proxy.EnumerateDevices()
         self.assertEqual(devs_before, devs_after)
 
-        mb1_up = devs_after[0]
-        self.assertEqual(self.get_dbus_dev_property(mb1_up, 'Model'), 'Fancy BT mouse')
-        self.assertEqual(self.get_dbus_dev_property(mb1_up, 'Percentage'), 20)
-        self.assertEqual(self.get_dbus_dev_property(mb1_up, 'PowerSupply'), False)
-        self.stop_daemon()
-
-    def test_hidpp_mouse(self):
-        '''HID++ mouse battery'''
-
-        parent = self.testbed.add_device('usb',
-                                         '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2',
-                                         None,
-                                         [], [])
-        parent = self.testbed.add_device('hid',
-                                         '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009',
-                                         parent,
-                                         [], [])
-        dev = self.testbed.add_device('hid',
-                                      '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009/0003:046D:4101.000A',
-                                      parent,
-                                      [], [])
-
-        parent = dev
-        self.testbed.add_device(
-            'input',
-            '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009/0003:046D:4101.000A/input/input22',
-            parent,
-            [], ['DEVNAME', 'input/mouse3', 'ID_INPUT_MOUSE', '1'])
-
-        self.testbed.add_device(
-            'power_supply',
-            '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009/0003:046D:4101.000A/power_supply/hidpp_battery_3',
-            parent,
-            ['type', 'Battery',
-             'scope', 'Device',
-             'present', '1',
-             'online', '1',
-             'status', 'Discharging',
-             'capacity', '30',
-             'serial_number', '123456',
-             'model_name', 'Fancy Logitech mouse'],
-            [])
-
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 1)
-        mousebat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Model'), 'Fancy Logitech mouse')
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 30)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Type'), UP_DEVICE_KIND_MOUSE)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Serial'), '123456')
-        self.assertEqual(self.get_dbus_property('OnBattery'), False)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
+        props = self.get_dbus_dev_properties(mb1_up)
+        self.assertEqual(props['Model'], 'Fancy BT mouse')
+        self.assertEqual(props['Percentage'], 20)
+        self.assertEqual(props['PowerSupply'], False)
         self.stop_daemon()
 
-    def test_usb_joypad(self):
-        '''DualShock 4 joypad connected via USB'''
-
-        dev = self.testbed.add_device('usb',
-                                      '/devices/pci0000:00/0000:00:14.0/usb3/3-9',
-                                      None,
-                                      [], [])
-
-        parent = dev
-        self.testbed.add_device(
-            'input',
-            '/devices/pci0000:00/0000:00:14.0/usb3/3-9/3-9:1.3/0003:054C:09CC.0007/input/input51',
-            parent,
-            ['name', 'Sony Interactive Entertainment Wireless Controller',
-             'uniq', 'ff:ff:ff:ff:ff:ff'],
-            ['ID_INPUT', '1',
-             'ID_INPUT_JOYSTICK', '1'])
-
-        dev = self.testbed.add_device(
-            'power_supply',
-            '/devices/pci0000:00/0000:00:14.0/usb3/3-9/3-9:1.3/0003:054C:09CC.0007/power_supply/sony_controller_battery_ff:ff:ff:ff:ff:ff',
-            parent,
-            ['type', 'Battery',
-             'scope', 'Device',
-             'present', '1',
-             'status', 'Charging',
-             'capacity', '20',],
-            [])
-
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 1)
-        joypadbat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(joypadbat0_up, 'Model'), 'Sony Interactive Entertainment Wireless Controller')
-        self.assertEqual(self.get_dbus_dev_property(joypadbat0_up, 'Serial'), 'ff:ff:ff:ff:ff:ff')
-        self.assertEqual(self.get_dbus_dev_property(joypadbat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(joypadbat0_up, 'Type'), UP_DEVICE_KIND_GAMING_INPUT)
-        self.assertEqual(self.get_dbus_property('OnBattery'), False)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-
     def test_hidpp_touchpad_race(self):
         '''HID++ touchpad with input node that appears later'''
 
-        parent = self.testbed.add_device('usb',
-                                         '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2',
-                                         None,
-                                         [], [])
-        parent = self.testbed.add_device('hid',
-                                         '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009',
-                                         parent,
-                                         [], [])
-        dev = self.testbed.add_device('hid',
-                                      '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009/0003:046D:4101.000A',
-                                      parent,
-                                      [], [])
-
-        parent = dev
-        batt_dev = self.testbed.add_device(
-            'power_supply',
-            '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009/0003:046D:4101.000A/power_supply/hidpp_battery_3',
-            parent,
-            ['type', 'Battery',
-             'scope', 'Device',
-             'present', '1',
-             'online', '1',
-             'status', 'Discharging',
-             'capacity_level', 'Full\n',
-             'serial_number', '123456',
-             'model_name', 'Logitech T650'],
-            [])
+        batt_dev = self._add_devices([
+            ('usb', HIDPP_USB, {}, {}),
+            ('hid', HIDPP_RECEIVER, {}, {}),
+            ('hid', HIDPP_DEVICE, {}, {}),
+            ('power_supply', HIDPP_PSU,
+             {'type': 'Battery',
+              'scope': 'Device',
+              'present': '1',
+              'online': '1',
+              'status': 'Discharging',
+              'capacity_level': 'Full\n',
+              'serial_number': '123456',
+              'model_name': 'Logitech T650'},
+             {}),
+        ])[-1]
 
         self.start_daemon()
         devs = self.proxy.EnumerateDevices()
         self.assertEqual(len(devs), 1)
         mousebat0_up = devs[0]
 
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Model'), 'Logitech T650')
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Type'), UP_DEVICE_KIND_BATTERY)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Serial'), '123456')
+        props = self.get_dbus_dev_properties(mousebat0_up)
+        self.assertEqual(props['Model'], 'Logitech T650')
+        self.assertEqual(props['PowerSupply'], False)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_BATTERY)
+        self.assertEqual(props['Serial'], '123456')
         self.assertEqual(self.get_dbus_property('OnBattery'), False)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
 
         # Now test all the levels
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 100)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'BatteryLevel'), UP_DEVICE_LEVEL_FULL)
+        self.assertEqual(props['Percentage'], 100)
+        self.assertEqual(props['BatteryLevel'], UP_DEVICE_LEVEL_FULL)
 
-        self.testbed.add_device(
-            'input',
-            '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009/0003:046D:4101.000A/input/input22',
-            parent,
-            [], ['DEVNAME', 'input/mouse3', 'ID_INPUT_TOUCHPAD', '1', 'ID_INPUT_MOUSE', '1'])
+        self._add_devices([
+            ('input', HIDPP_INPUT, {},
+             {'DEVNAME': 'input/mouse3', 'ID_INPUT_TOUCHPAD': '1', 'ID_INPUT_MOUSE': '1'}),
+        ])
         self.testbed.uevent(batt_dev, 'change')
-
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Type'), UP_DEVICE_KIND_TOUCHPAD)
+        self.wait_for_dbus_dev_property(mousebat0_up, 'Type', UP_DEVICE_KIND_TOUCHPAD)
 
     def test_hidpp_touchpad(self):
         '''HID++ touchpad battery with 5 capacity levels'''
 
-        parent = self.testbed.add_device('usb',
-                                         '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2',
-                                         None,
-                                         [], [])
-        parent = self.testbed.add_device('hid',
-                                         '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009',
-                                         parent,
-                                         [], [])
-        dev = self.testbed.add_device('hid',
-                                      '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009/0003:046D:4101.000A',
-                                      parent,
-                                      [], [])
-
-        parent = dev
-        self.testbed.add_device(
-            'input',
-            '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009/0003:046D:4101.000A/input/input22',
-            parent,
-            [], ['DEVNAME', 'input/mouse3', 'ID_INPUT_TOUCHPAD', '1', 'ID_INPUT_MOUSE', '1'])
-
-        dev = self.testbed.add_device(
-            'power_supply',
-            '/devices/pci0000:00/0000:00:14.0/usb3/3-10/3-10:1.2/0003:046D:C52B.0009/0003:046D:4101.000A/power_supply/hidpp_battery_3',
-            parent,
-            ['type', 'Battery',
-             'scope', 'Device',
-             'present', '1',
-             'online', '1',
-             'status', 'Discharging',
-             'capacity_level', 'Full\n',
-             'serial_number', '123456',
-             'model_name', 'Logitech T650'],
-            [])
+        dev = self._add_devices([
+            ('usb', HIDPP_USB, {}, {}),
+            ('hid', HIDPP_RECEIVER, {}, {}),
+            ('hid', HIDPP_DEVICE, {}, {}),
+            ('input', HIDPP_INPUT, {},
+             {'DEVNAME': 'input/mouse3', 'ID_INPUT_TOUCHPAD': '1', 'ID_INPUT_MOUSE': '1'}),
+            ('power_supply', HIDPP_PSU,
+             {'type': 'Battery',
+              'scope': 'Device',
+              'present': '1',
+              'online': '1',
+              'status': 'Discharging',
+              'capacity_level': 'Full\n',
+              'serial_number': '123456',
+              'model_name': 'Logitech T650'},
+             {}),
+        ])[-1]
 
         self.start_daemon()
         devs = self.proxy.EnumerateDevices()
         self.assertEqual(len(devs), 1)
         mousebat0_up = devs[0]
 
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Model'), 'Logitech T650')
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Type'), UP_DEVICE_KIND_TOUCHPAD)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Serial'), '123456')
+        props = self.get_dbus_dev_properties(mousebat0_up)
+        self.assertEqual(props['Model'], 'Logitech T650')
+        self.assertEqual(props['PowerSupply'], False)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_TOUCHPAD)
+        self.assertEqual(props['Serial'], '123456')
         self.assertEqual(self.get_dbus_property('OnBattery'), False)
         self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
 
         # Now test all the levels
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 100)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'BatteryLevel'), UP_DEVICE_LEVEL_FULL)
-
-        self.testbed.set_attribute(dev, 'capacity_level', 'Critical\n')
-        self.testbed.uevent(dev, 'change')
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 5)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'BatteryLevel'), UP_DEVICE_LEVEL_CRITICAL)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'WarningLevel'), UP_DEVICE_LEVEL_CRITICAL)
-
-        self.testbed.set_attribute(dev, 'capacity_level', 'Low\n')
-        self.testbed.uevent(dev, 'change')
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 10)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'BatteryLevel'), UP_DEVICE_LEVEL_LOW)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'WarningLevel'), UP_DEVICE_LEVEL_LOW)
-
-        self.testbed.set_attribute(dev, 'capacity_level', 'High\n')
-        self.testbed.uevent(dev, 'change')
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 70)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'BatteryLevel'), UP_DEVICE_LEVEL_HIGH)
-
-        self.testbed.set_attribute(dev, 'capacity_level', 'Normal\n')
-        self.testbed.uevent(dev, 'change')
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 55)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'BatteryLevel'), UP_DEVICE_LEVEL_NORMAL)
-
-        self.testbed.set_attribute(dev, 'capacity_level', 'Unknown\n')
-        self.testbed.set_attribute(dev, 'status', 'Charging\n')
-        self.testbed.uevent(dev, 'change')
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 50.0)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'BatteryLevel'), UP_DEVICE_LEVEL_UNKNOWN)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'State'), UP_DEVICE_STATE_CHARGING)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'IconName'), 'battery-good-charging-symbolic')
-
-        self.testbed.set_attribute(dev, 'capacity_level', 'Full\n')
-        self.testbed.set_attribute(dev, 'status', 'Full\n')
-        self.testbed.uevent(dev, 'change')
-        time.sleep(0.5)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 100)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'BatteryLevel'), UP_DEVICE_LEVEL_FULL)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'State'), UP_DEVICE_STATE_FULLY_CHARGED)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'IconName'), 'battery-full-charged-symbolic')
-
-        self.stop_daemon()
-
-    def test_bluetooth_hid_mouse(self):
-        '''bluetooth HID mouse battery'''
-
-        dev = self.testbed.add_device(
-            'bluetooth',
-            '/devices/pci0000:00/0000:00:14.0/usb2/2-7/2-7:1.0/bluetooth/hci0',
-            None,
-            [], [])
-
-        parent = dev
-        dev = self.testbed.add_device(
-            'bluetooth',
-            'hci0:256',
-            parent,
-            [], ['DEVTYPE', 'link'])
-
-        parent = dev
-        dev = self.testbed.add_device(
-            'hid',
-            '0005:046D:B00D.0002',
-            parent,
-            [], ['HID_NAME', 'Fancy BT Mouse'])
-
-        parent = dev
-        self.testbed.add_device(
-            'power_supply',
-            'power_supply/hid-00:1f:20:96:33:47-battery',
-            parent,
-            ['type', 'Battery',
-             'scope', 'Device',
-             'present', '1',
-             'online', '1',
-             'status', 'Discharging',
-             'capacity', '30',
-             'model_name', 'Fancy BT mouse'],
-            [])
-
-        dev = self.testbed.add_device(
-            'input',
-            'input/input22',
-            parent,
-            [], ['ID_INPUT_MOUSE', '1'])
+        self.assertEqual(props['Percentage'], 100)
+        self.assertEqual(props['BatteryLevel'], UP_DEVICE_LEVEL_FULL)
+
+        # state machine: the sysfs attributes to change in each step, and the
+        # device properties expected afterwards
+        states = [
+            ({'capacity_level': 'Critical\n'},
+             {'Percentage': 5,
+              'BatteryLevel': UP_DEVICE_LEVEL_CRITICAL,
+              'WarningLevel': UP_DEVICE_LEVEL_CRITICAL}),
+            ({'capacity_level': 'Low\n'},
+             {'Percentage': 10,
+              'BatteryLevel': UP_DEVICE_LEVEL_LOW,
+              'WarningLevel': UP_DEVICE_LEVEL_LOW}),
+            ({'capacity_level': 'High\n'},
+             {'Percentage': 70,
+              'BatteryLevel': UP_DEVICE_LEVEL_HIGH}),
+            ({'capacity_level': 'Normal\n'},
+             {'Percentage': 55,
+              'BatteryLevel': UP_DEVICE_LEVEL_NORMAL}),
+            ({'capacity_level': 'Unknown\n', 'status': 'Charging\n'},
+             {'Percentage': 50.0,
+              'BatteryLevel': UP_DEVICE_LEVEL_UNKNOWN,
+              'State': UP_DEVICE_STATE_CHARGING,
+              'IconName': 'battery-good-charging-symbolic'}),
+            ({'capacity_level': 'Full\n', 'status': 'Full\n'},
+             {'Percentage': 100,
+              'BatteryLevel': UP_DEVICE_LEVEL_FULL,
+              'State': UP_DEVICE_STATE_FULLY_CHARGED,
+              'IconName': 'battery-full-charged-symbolic'}),
+        ]
 
-        parent = dev
-        self.testbed.add_device(
-            'input',
-            'mouse1',
-            parent,
-            [], ['ID_INPUT_MOUSE', '1'])
+        def current(expected):
+            props = self.get_dbus_dev_properties(mousebat0_up)
+            return {k: props[k] for k in expected}
 
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 1)
-        mousebat0_up = devs[0]
+        for attributes, expected in states:
+            self.testbed_update(dev, attributes)
+            self.assertEventually(lambda: current(expected), value=expected, timeout=20,
+                                  message=f'properties after setting {attributes} should be {expected}')
 
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Model'), 'Fancy BT mouse')
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 30)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Type'), UP_DEVICE_KIND_MOUSE)
-        self.assertEqual(self.get_dbus_property('OnBattery'), False)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
         self.stop_daemon()
 
     def test_virtual_unparented_device(self):
@@ -1811,365 +1794,6 @@ class Tests(dbusmock.DBusTestCase):
         devs = self.proxy.EnumerateDevices()
         self.stop_daemon()
 
-    def test_bluetooth_hid_mouse_no_legacy_subdevice(self):
-        '''bluetooth HID mouse battery'''
-
-        dev = self.testbed.add_device(
-            'bluetooth',
-            '/devices/pci0000:00/0000:00:14.0/usb2/2-7/2-7:1.0/bluetooth/hci0',
-            None,
-            [], [])
-
-        parent = dev
-        dev = self.testbed.add_device(
-            'bluetooth',
-            'hci0:256',
-            parent,
-            [], ['DEVTYPE', 'link'])
-
-        parent = dev
-        dev = self.testbed.add_device(
-            'hid',
-            '0005:046D:B00D.0002',
-            parent,
-            [], ['HID_NAME', 'Fancy BT Mouse'])
-
-        parent = dev
-        self.testbed.add_device(
-            'power_supply',
-            'power_supply/hid-00:1f:20:96:33:47-battery',
-            parent,
-            ['type', 'Battery',
-             'scope', 'Device',
-             'present', '1',
-             'online', '1',
-             'status', 'Discharging',
-             'capacity', '30',
-             'model_name', 'Fancy BT mouse'],
-            [])
-
-        self.testbed.add_device(
-            'input',
-            'input/input22',
-            parent,
-            [], ['ID_INPUT_MOUSE', '1'])
-
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 1)
-        mousebat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Model'), 'Fancy BT mouse')
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Percentage'), 30)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(mousebat0_up, 'Type'), UP_DEVICE_KIND_MOUSE)
-        self.assertEqual(self.get_dbus_property('OnBattery'), False)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.stop_daemon()
-
-    def test_bluetooth_keyboard(self):
-        '''bluetooth keyboard battery'''
-
-        dev = self.testbed.add_device('bluetooth',
-                                      'usb2/bluetooth/hci0/hci0:1',
-                                      None,
-                                      [], [])
-
-        parent = dev
-        self.testbed.add_device(
-            'input',
-            'input3/event4',
-            parent,
-            [], ['DEVNAME', 'input/event4', 'ID_INPUT_KEYBOARD', '1'])
-
-        self.testbed.add_device(
-            'power_supply',
-            'power_supply/hid-00:22:33:44:55:66-battery',
-            parent,
-            ['type', 'Battery',
-             'scope', 'Device',
-             'present', '1',
-             'online', '1',
-             'status', 'Discharging',
-             'capacity', '40',
-             'model_name', 'Monster Typist'],
-            [])
-
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 1)
-        kbdbat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'Model'), 'Monster Typist')
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'Percentage'), 40)
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'Type'), UP_DEVICE_KIND_KEYBOARD)
-        self.assertEqual(self.get_dbus_property('OnBattery'), False)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.stop_daemon()
-
-    def test_bluetooth_mouse_with_keyboard(self):
-        '''mouse with a few keys (but not a keyboard)'''
-
-        dev = self.testbed.add_device('bluetooth',
-                                      'usb2/bluetooth/hci0/hci0:1',
-                                      None,
-                                      [], [])
-
-        parent = dev
-        self.testbed.add_device(
-            'input',
-            'input3/event3',
-            parent,
-            [], ['DEVNAME', 'input/event3', 'ID_INPUT_KEYBOARD', '1', 'ID_INPUT_MOUSE', '1'])
-
-        self.testbed.add_device(
-            'power_supply',
-            'power_supply/hid-00:22:33:44:55:66-battery',
-            parent,
-            ['type', 'Battery',
-             'scope', 'Device',
-             'present', '1',
-             'online', '1',
-             'status', 'Discharging',
-             'capacity', '40',
-             'model_name', 'Monster Mouse'],
-            [])
-
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 1)
-        kbdbat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'Model'), 'Monster Mouse')
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'Percentage'), 40)
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'Type'), UP_DEVICE_KIND_MOUSE)
-        self.assertEqual(self.get_dbus_property('OnBattery'), False)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.stop_daemon()
-
-    def test_bluetooth_mouse_and_keyboard(self):
-        '''keyboard/mouse combo battery'''
-
-        dev = self.testbed.add_device('bluetooth',
-                                      'usb2/bluetooth/hci0/hci0:1',
-                                      None,
-                                      [], [])
-
-        parent = dev
-        self.testbed.add_device(
-            'input',
-            'input3/event3',
-            parent,
-            [], ['DEVNAME', 'input/event3', 'ID_INPUT_MOUSE', '1'])
-
-        self.testbed.add_device(
-            'input',
-            'input3/event4',
-            parent,
-            [], ['DEVNAME', 'input/event4', 'ID_INPUT_KEYBOARD', '1'])
-
-        self.testbed.add_device(
-            'power_supply',
-            'power_supply/hid-00:22:33:44:55:66-battery',
-            parent,
-            ['type', 'Battery',
-             'scope', 'Device',
-             'present', '1',
-             'online', '1',
-             'status', 'Discharging',
-             'capacity', '40',
-             'model_name', 'Monster Typist Mouse/Keyboard Combo'],
-            [])
-
-        self.start_daemon()
-        devs = self.proxy.EnumerateDevices()
-        self.assertEqual(len(devs), 1)
-        kbdbat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'Model'), 'Monster Typist Mouse/Keyboard Combo')
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'Percentage'), 40)
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(kbdbat0_up, 'Type'), UP_DEVICE_KIND_KEYBOARD)
-        self.assertEqual(self.get_dbus_property('OnBattery'), False)
-        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
-        self.stop_daemon()
-
-    def _add_bluez_battery_device(self, alias, device_properties, battery_level):
-        self.start_bluez()
-
-        # Add an adapter to both bluez and udev
-        adapter_name = 'hci0'
-        path = self.bluez_obj.AddAdapter(adapter_name, 'my-computer')
-        self.assertEqual(path, '/org/bluez/' + adapter_name)
-
-        dev = self.testbed.add_device('bluetooth',
-                                      'usb2/bluetooth/hci0/hci0:1',
-                                      None,
-                                      [], [])
-
-        # Add a device to bluez
-        address = '11:22:33:44:55:66'
-
-        path = self.bluez_obj.AddDevice(adapter_name, address, alias)
-
-        device = self.dbus_con.get_object('org.bluez', path)
-
-        if device_properties:
-            try:
-                # The properties are only installed for umockdev newer than 0.25.0
-                device.UpdateProperties(DEVICE_IFACE, device_properties)
-            except dbus.exceptions.DBusException:
-                device.AddProperties(DEVICE_IFACE, device_properties)
-
-        battery_properties = {
-            'Percentage': dbus.Byte(battery_level, variant_level=1),
-        }
-
-        device.AddProperties(BATTERY_IFACE, battery_properties)
-
-        self.start_daemon()
-
-        # process = subprocess.Popen(['gdbus', 'introspect', '--system', '--dest', 'org.bluez', '--object-path', '/org/bluez/hci0/dev_11_22_33_44_55_66'])
-
-        # Wait for UPower to process the new device
-        time.sleep(0.5)
-        return self.proxy.EnumerateDevices()
-
-    def test_bluetooth_le_mouse(self):
-        '''Bluetooth LE mouse'''
-
-        alias = 'Arc Touch Mouse SE'
-        battery_level = 99
-        device_properties = {
-            'Appearance': dbus.UInt16(0x03c2, variant_level=1)
-        }
-
-        devs = self._add_bluez_battery_device(alias, device_properties, battery_level)
-        self.assertEqual(len(devs), 1)
-        mouse_bat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(mouse_bat0_up, 'Model'), alias)
-        self.assertEqual(self.get_dbus_dev_property(mouse_bat0_up, 'Percentage'), battery_level)
-        self.assertEqual(self.get_dbus_dev_property(mouse_bat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(mouse_bat0_up, 'Type'), UP_DEVICE_KIND_MOUSE)
-        self.assertEqual(self.get_dbus_dev_property(mouse_bat0_up, 'UpdateTime') != 0, True)
-        self.stop_daemon()
-
-    def test_bluetooth_le_device(self):
-        '''Bluetooth LE Device'''
-        '''See https://gitlab.freedesktop.org/upower/upower/issues/100'''
-
-        alias = 'Satechi M1 Mouse'
-        battery_level = 99
-        device_properties = None
-
-        devs = self._add_bluez_battery_device(alias, device_properties, battery_level)
-        self.assertEqual(len(devs), 1)
-        mouse_bat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(mouse_bat0_up, 'Model'), alias)
-        self.assertEqual(self.get_dbus_dev_property(mouse_bat0_up, 'Percentage'), battery_level)
-        self.assertEqual(self.get_dbus_dev_property(mouse_bat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(mouse_bat0_up, 'Type'), UP_DEVICE_KIND_BLUETOOTH_GENERIC)
-        self.stop_daemon()
-
-    def test_bluetooth_headphones(self):
-        '''Bluetooth Headphones'''
-
-        alias = 'WH-1000XM3'
-        battery_level = 99
-        device_properties = {
-            'Class': dbus.UInt32(0x240404, variant_level=1)
-        }
-
-        devs = self._add_bluez_battery_device(alias, device_properties, battery_level)
-        self.assertEqual(len(devs), 1)
-        bat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Model'), alias)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), battery_level)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Type'), UP_DEVICE_KIND_HEADSET)
-        self.stop_daemon()
-
-    def test_bluetooth_wireless_earbuds(self):
-        '''Bluetooth Wireless Earbuds'''
-
-        alias = 'QCY-qs2_R'
-        battery_level = 99
-        device_properties = {
-            'Class': dbus.UInt32(0x240418, variant_level=1)
-        }
-
-        devs = self._add_bluez_battery_device(alias, device_properties, battery_level)
-        self.assertEqual(len(devs), 1)
-        bat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Model'), alias)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), battery_level)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Type'), UP_DEVICE_KIND_HEADPHONES)
-        self.stop_daemon()
-
-    def test_bluetooth_phone(self):
-        '''Bluetooth Phone'''
-
-        alias = 'Phone'
-        battery_level = 99
-        device_properties = {
-            'Class': dbus.UInt32(0x5a020c, variant_level=1)
-        }
-
-        devs = self._add_bluez_battery_device(alias, device_properties, battery_level)
-        self.assertEqual(len(devs), 1)
-        bat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Model'), alias)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), battery_level)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Type'), UP_DEVICE_KIND_PHONE)
-        self.stop_daemon()
-
-    def test_bluetooth_computer(self):
-        '''Bluetooth Computer'''
-
-        alias = 'Computer'
-        battery_level = 99
-        device_properties = {
-            'Class': dbus.UInt32(0x6c010c, variant_level=1)
-        }
-
-        devs = self._add_bluez_battery_device(alias, device_properties, battery_level)
-        self.assertEqual(len(devs), 1)
-        bat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Model'), alias)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), battery_level)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Type'), UP_DEVICE_KIND_COMPUTER)
-        self.stop_daemon()
-
-    def test_bluetooth_heart_rate_monitor(self):
-        '''Bluetooth Heart Rate Monitor'''
-
-        alias = 'Polar H7'
-        battery_level = 99
-        device_properties = {
-            'Appearance': dbus.UInt16(0x0341, variant_level=1)
-        }
-
-        devs = self._add_bluez_battery_device(alias, device_properties, battery_level)
-        self.assertEqual(len(devs), 1)
-        bat0_up = devs[0]
-
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Model'), alias)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Percentage'), battery_level)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'PowerSupply'), False)
-        self.assertEqual(self.get_dbus_dev_property(bat0_up, 'Type'), UP_DEVICE_KIND_BLUETOOTH_GENERIC)
-        self.stop_daemon()
-
     def test_charge_cycles(self):
         '''Charge cycles'''
 
@@ -2324,7 +1948,6 @@ class Tests(dbusmock.DBusTestCase):
         self.assertIn(client.get_lid_is_closed(), [False, True])
         self.assertEqual(client.get_on_battery(), False)
         self.assertEqual(client.get_critical_action(), 'HybridSleep')
-        self.stop_daemon()
 
     def test_lib_up_client_async(self):
         '''Test up_client_async_new()'''
@@ -2355,19 +1978,458 @@ class Tests(dbusmock.DBusTestCase):
         # client.get_devices_async(None, get_devices_cb)
         # ml.run()
 
+
+class UPowerBluezTests(UPowerTestCase):
+    '''Tests for bluetooth devices which upowerd gets from bluez
+
+    These share one bluez mock with one adapter; every test removes the
+    devices it added to it again.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.bluez, cls.bluez_obj = cls.spawn_server_template('bluez5', {})
+        path = cls.bluez_obj.AddAdapter('hci0', 'my-computer')
+        assert path == '/org/bluez/hci0', path
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            cls.stop_daemon()
+        finally:
+            cls.stop_process(cls.bluez)
+            super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+
+        # the adapter in udev; tearDown() recreates the testbed after each test
+        self.testbed.add_device('bluetooth',
+                                'usb2/bluetooth/hci0/hci0:1',
+                                None,
+                                [], [])
+
+    def _add_bluez_battery(self, path, device_properties, battery_level):
+        '''Give a bluez device a battery and start the daemon
+
+        upowerd follows InterfacesAdded of the bluez object manager, but the
+        mock's AddProperties() does not emit it for the Battery1 interface, so
+        the daemon only sees the battery when it starts after adding it.
+        Return the object path of the new upower device.
+        '''
+        def call_mock(method, iface, properties):
+            self.dbus.call_sync('org.bluez', path, dbusmock.MOCK_IFACE, method,
+                                GLib.Variant('(sa{sv})', (iface, properties)),
+                                None, Gio.DBusCallFlags.NO_AUTO_START, -1, None)
+
+        if device_properties:
+            try:
+                # The properties are only installed for umockdev newer than 0.25.0
+                call_mock('UpdateProperties', DEVICE_IFACE, device_properties)
+            except GLib.Error:
+                call_mock('AddProperties', DEVICE_IFACE, device_properties)
+
+        battery_properties = {
+            'Percentage': GLib.Variant('y', battery_level),
+        }
+
+        call_mock('AddProperties', BATTERY_IFACE, battery_properties)
+
+        self.start_daemon()
+
+        # process = subprocess.Popen(['gdbus', 'introspect', '--system', '--dest', 'org.bluez', '--object-path', '/org/bluez/hci0/dev_11_22_33_44_55_66'])
+
+        # Wait for UPower to process the new device
+        return self.wait_for_devices(1, timeout=20)[0]
+
+    def _check_bluez_battery_device(self, alias, device_properties, kind):
+        '''Check the upower device of a bluez device with a battery'''
+
+        battery_level = 99
+        address = '11:22:33:44:55:66'
+        path = self.bluez_obj.AddDevice('hci0', address, alias)
+        try:
+            bat0_up = self._add_bluez_battery(path, device_properties, battery_level)
+
+            props = self.get_dbus_dev_properties(bat0_up)
+            self.assertEqual(props['Model'], alias)
+            self.assertEqual(props['Percentage'], battery_level)
+            self.assertEqual(props['PowerSupply'], False)
+            self.assertEqual(props['Type'], kind)
+            self.assertNotEqual(props['UpdateTime'], 0)
+        finally:
+            self.bluez_obj.RemoveDevice('hci0', address)
+        self.stop_daemon()
+
+    def test_bluetooth_le_mouse(self):
+        '''Bluetooth LE mouse'''
+
+        self._check_bluez_battery_device(
+            'Arc Touch Mouse SE',
+            {'Appearance': GLib.Variant('q', BT_APPEARANCE_MOUSE)},
+            UP_DEVICE_KIND_MOUSE)
+
+    def test_bluetooth_le_device(self):
+        '''Bluetooth LE Device
+
+        See https://gitlab.freedesktop.org/upower/upower/issues/100
+        '''
+
+        self._check_bluez_battery_device(
+            'Satechi M1 Mouse', None, UP_DEVICE_KIND_BLUETOOTH_GENERIC)
+
+    def test_bluetooth_headphones(self):
+        '''Bluetooth Headphones'''
+
+        self._check_bluez_battery_device(
+            'WH-1000XM3',
+            {'Class': GLib.Variant('u', BT_CLASS_HEADSET)},
+            UP_DEVICE_KIND_HEADSET)
+
+    def test_bluetooth_wireless_earbuds(self):
+        '''Bluetooth Wireless Earbuds'''
+
+        self._check_bluez_battery_device(
+            'QCY-qs2_R',
+            {'Class': GLib.Variant('u', BT_CLASS_HEADPHONES)},
+            UP_DEVICE_KIND_HEADPHONES)
+
+    def test_bluetooth_phone(self):
+        '''Bluetooth Phone'''
+
+        self._check_bluez_battery_device(
+            'Phone',
+            {'Class': GLib.Variant('u', BT_CLASS_PHONE)},
+            UP_DEVICE_KIND_PHONE)
+
+    def test_bluetooth_computer(self):
+        '''Bluetooth Computer'''
+
+        self._check_bluez_battery_device(
+            'Computer',
+            {'Class': GLib.Variant('u', BT_CLASS_COMPUTER)},
+            UP_DEVICE_KIND_COMPUTER)
+
+    def test_bluetooth_heart_rate_monitor(self):
+        '''Bluetooth Heart Rate Monitor'''
+
+        self._check_bluez_battery_device(
+            'Polar H7',
+            {'Appearance': GLib.Variant('q', BT_APPEARANCE_HEART_RATE_BELT)},
+            UP_DEVICE_KIND_BLUETOOTH_GENERIC)
+
+
+class UPowerReadOnlyTests(UPowerTestCase):
+    '''Tests which only check the properties of newly added devices
+
+    These share one daemon: the devices get hotplugged after starting it and
+    are unplugged again after each test.
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.start_daemon()
+
+    def tearDown(self):
+        try:
+            self.unplug_devices()
+        finally:
+            super().tearDown()
+
+    def unplug_devices(self):
+        '''Remove all devices from the testbed again
+
+        This sends a remove uevent for all of them and waits for upowerd to
+        drop them, so that the daemon can be re-used for the next test.
+        '''
+        sys_dir = self.testbed.get_sys_dir()
+        devices_dir = os.path.join(sys_dir, 'devices')
+        devices = [root for root, dirs, files in os.walk(devices_dir)
+                   if os.path.islink(os.path.join(root, 'subsystem'))]
+        if not devices:
+            return
+
+        # children first, like the kernel does
+        for dev in sorted(devices, key=lambda d: d.count('/'), reverse=True):
+            self.testbed.uevent('/sys' + dev[len(sys_dir):], 'remove')
+        self.wait_for_devices(0)
+
+        # this also removes all child devices
+        for dev in devices:
+            if not any(dev.startswith(d + '/') for d in devices):
+                self.testbed.remove_device('/sys' + dev[len(sys_dir):])
+        # and the plain directories leading to them
+        for name in os.listdir(devices_dir):
+            shutil.rmtree(os.path.join(devices_dir, name))
+
     #
-    # Helper methods
+    # Actual test cases
     #
 
-    @classmethod
-    def _props_to_str(cls, properties):
-        '''Convert a properties dictionary to uevent text representation.'''
-
-        prop_str = ''
-        if properties:
-            for k, v in properties.items():
-                prop_str += '%s=%s\n' % (k, v)
-        return prop_str
+    def test_battery_properties(self):
+        '''properties of different kinds of batteries'''
+
+        # name, sysfs attributes, expected device, DisplayDevice and daemon properties
+        cases = [
+            ('reports capacity and charge_full',
+             BATTERY_ATTRIBUTES + ('status', 'Discharging',
+                                   'charge_full', '10500000',
+                                   'charge_full_design', '11000000',
+                                   'capacity', '40'),
+             {'Percentage': 40.0,
+              'State': UP_DEVICE_STATE_DISCHARGING,
+              'Energy': 50.4,
+              'EnergyFull': 126.0,
+              'EnergyFullDesign': 132.0,
+              'Voltage': 12.0},
+             {'WarningLevel': UP_DEVICE_LEVEL_NONE},
+             {'OnBattery': True}),
+            ('reports temperature',
+             BATTERY_ATTRIBUTES + ('status', 'Discharging',
+                                   'temp', '254',
+                                   'energy_full', '60000000',
+                                   'energy_full_design', '80000000',
+                                   'energy_now', '1500000'),
+             {'Temperature': 25.4,
+              'Percentage': 2.5,
+              'Energy': 1.5},
+             {'WarningLevel': UP_DEVICE_LEVEL_CRITICAL},
+             {'OnBattery': True}),
+            ('zero power draw, e.g. in a dual-battery system',
+             BATTERY_ATTRIBUTES + ('status', 'Full',
+                                   'energy_full', '60000000',
+                                   'energy_full_design', '80000000',
+                                   'energy_now', '60000000',
+                                   'power_now', '0',
+                                   'current_now', '787000'),
+             {'EnergyRate': 0.0},
+             {},
+             {}),
+        ]
+
+        for name, attributes, device_props, display_props, daemon_props in cases:
+            with self.subTest(name):
+                self.testbed.add_device('power_supply', 'BAT0', None,
+                                        list(attributes), [])
+                try:
+                    bat0_up = self.wait_for_devices(1)[0]
+
+                    props = self.get_dbus_dev_properties(bat0_up)
+                    for k, v in device_props.items():
+                        self.assertEqual(props[k], v, msg=f'Property "{k}" should be {v} but is {props[k]}')
+                    for k, v in display_props.items():
+                        self.assertEqual(self.get_dbus_display_property(k), v)
+                    for k, v in daemon_props.items():
+                        self.assertEqual(self.get_dbus_property(k), v)
+                finally:
+                    self.unplug_devices()
+
+    def test_bluetooth_mouse(self):
+        '''bluetooth mouse battery'''
+
+        self._add_bt_mouse()
+
+        devs = self.wait_for_devices(1)
+        mousebat0_up = devs[0]
+
+        props = self.get_dbus_dev_properties(mousebat0_up)
+        self.assertEqual(props['Model'], 'Fancy BT mouse')
+        self.assertEqual(props['Percentage'], 30)
+        self.assertEqual(props['PowerSupply'], False)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_MOUSE)
+        self.assertEqual(self.get_dbus_property('OnBattery'), False)
+        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
+
+    def test_bluetooth_hid_mouse(self):
+        '''bluetooth HID mouse battery'''
+
+        self._add_devices(BT_HID_MOUSE_DEVICES)
+
+        devs = self.wait_for_devices(1)
+        mousebat0_up = devs[0]
+
+        props = self.get_dbus_dev_properties(mousebat0_up)
+        self.assertEqual(props['Model'], 'Fancy BT mouse')
+        self.assertEqual(props['Percentage'], 30)
+        self.assertEqual(props['PowerSupply'], False)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_MOUSE)
+        self.assertEqual(self.get_dbus_property('OnBattery'), False)
+        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
+
+    def test_bluetooth_hid_mouse_no_legacy_subdevice(self):
+        '''bluetooth HID mouse battery'''
+
+        # without the legacy mouse1 input device below the input node
+        self._add_devices([d for d in BT_HID_MOUSE_DEVICES if not d[1].endswith('/mouse1')])
+
+        devs = self.wait_for_devices(1)
+        mousebat0_up = devs[0]
+
+        props = self.get_dbus_dev_properties(mousebat0_up)
+        self.assertEqual(props['Model'], 'Fancy BT mouse')
+        self.assertEqual(props['Percentage'], 30)
+        self.assertEqual(props['PowerSupply'], False)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_MOUSE)
+        self.assertEqual(self.get_dbus_property('OnBattery'), False)
+        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
+
+    def test_bluetooth_keyboard(self):
+        '''bluetooth keyboard battery'''
+
+        hci = 'usb2/bluetooth/hci0/hci0:1'
+        self._add_devices([
+            ('bluetooth', hci, {}, {}),
+            ('input', f'{hci}/input3/event4', {},
+             {'DEVNAME': 'input/event4', 'ID_INPUT_KEYBOARD': '1'}),
+            ('power_supply', f'{hci}/power_supply/hid-00:22:33:44:55:66-battery',
+             {'type': 'Battery',
+              'scope': 'Device',
+              'present': '1',
+              'online': '1',
+              'status': 'Discharging',
+              'capacity': '40',
+              'model_name': 'Monster Typist'},
+             {}),
+        ])
+
+        devs = self.wait_for_devices(1)
+        kbdbat0_up = devs[0]
+
+        props = self.get_dbus_dev_properties(kbdbat0_up)
+        self.assertEqual(props['Model'], 'Monster Typist')
+        self.assertEqual(props['Percentage'], 40)
+        self.assertEqual(props['PowerSupply'], False)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_KEYBOARD)
+        self.assertEqual(self.get_dbus_property('OnBattery'), False)
+        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
+
+    def test_bluetooth_mouse_with_keyboard(self):
+        '''mouse with a few keys (but not a keyboard)'''
+
+        hci = 'usb2/bluetooth/hci0/hci0:1'
+        self._add_devices([
+            ('bluetooth', hci, {}, {}),
+            ('input', f'{hci}/input3/event3', {},
+             {'DEVNAME': 'input/event3', 'ID_INPUT_KEYBOARD': '1', 'ID_INPUT_MOUSE': '1'}),
+            ('power_supply', f'{hci}/power_supply/hid-00:22:33:44:55:66-battery',
+             {'type': 'Battery',
+              'scope': 'Device',
+              'present': '1',
+              'online': '1',
+              'status': 'Discharging',
+              'capacity': '40',
+              'model_name': 'Monster Mouse'},
+             {}),
+        ])
+
+        devs = self.wait_for_devices(1)
+        kbdbat0_up = devs[0]
+
+        props = self.get_dbus_dev_properties(kbdbat0_up)
+        self.assertEqual(props['Model'], 'Monster Mouse')
+        self.assertEqual(props['Percentage'], 40)
+        self.assertEqual(props['PowerSupply'], False)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_MOUSE)
+        self.assertEqual(self.get_dbus_property('OnBattery'), False)
+        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
+
+    def test_bluetooth_mouse_and_keyboard(self):
+        '''keyboard/mouse combo battery'''
+
+        hci = 'usb2/bluetooth/hci0/hci0:1'
+        self._add_devices([
+            ('bluetooth', hci, {}, {}),
+            ('input', f'{hci}/input3/event3', {},
+             {'DEVNAME': 'input/event3', 'ID_INPUT_MOUSE': '1'}),
+            ('input', f'{hci}/input3/event4', {},
+             {'DEVNAME': 'input/event4', 'ID_INPUT_KEYBOARD': '1'}),
+            ('power_supply', f'{hci}/power_supply/hid-00:22:33:44:55:66-battery',
+             {'type': 'Battery',
+              'scope': 'Device',
+              'present': '1',
+              'online': '1',
+              'status': 'Discharging',
+              'capacity': '40',
+              'model_name': 'Monster Typist Mouse/Keyboard Combo'},
+             {}),
+        ])
+
+        devs = self.wait_for_devices(1)
+        kbdbat0_up = devs[0]
+
+        props = self.get_dbus_dev_properties(kbdbat0_up)
+        self.assertEqual(props['Model'], 'Monster Typist Mouse/Keyboard Combo')
+        self.assertEqual(props['Percentage'], 40)
+        self.assertEqual(props['PowerSupply'], False)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_KEYBOARD)
+        self.assertEqual(self.get_dbus_property('OnBattery'), False)
+        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
+
+    def test_hidpp_mouse(self):
+        '''HID++ mouse battery'''
+
+        self._add_devices([
+            ('usb', HIDPP_USB, {}, {}),
+            ('hid', HIDPP_RECEIVER, {}, {}),
+            ('hid', HIDPP_DEVICE, {}, {}),
+            ('input', HIDPP_INPUT, {},
+             {'DEVNAME': 'input/mouse3', 'ID_INPUT_MOUSE': '1'}),
+            ('power_supply', HIDPP_PSU,
+             {'type': 'Battery',
+              'scope': 'Device',
+              'present': '1',
+              'online': '1',
+              'status': 'Discharging',
+              'capacity': '30',
+              'serial_number': '123456',
+              'model_name': 'Fancy Logitech mouse'},
+             {}),
+        ])
+
+        devs = self.wait_for_devices(1)
+        mousebat0_up = devs[0]
+
+        props = self.get_dbus_dev_properties(mousebat0_up)
+        self.assertEqual(props['Model'], 'Fancy Logitech mouse')
+        self.assertEqual(props['Percentage'], 30)
+        self.assertEqual(props['PowerSupply'], False)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_MOUSE)
+        self.assertEqual(props['Serial'], '123456')
+        self.assertEqual(self.get_dbus_property('OnBattery'), False)
+        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
+
+    def test_usb_joypad(self):
+        '''DualShock 4 joypad connected via USB'''
+
+        joypad = 'pci0000:00/0000:00:14.0/usb3/3-9/3-9:1.3/0003:054C:09CC.0007'
+        self._add_devices([
+            ('usb', 'pci0000:00/0000:00:14.0/usb3/3-9', {}, {}),
+            ('input', f'{joypad}/input/input51',
+             {'name': 'Sony Interactive Entertainment Wireless Controller',
+              'uniq': 'ff:ff:ff:ff:ff:ff'},
+             {'ID_INPUT': '1',
+              'ID_INPUT_JOYSTICK': '1'}),
+            ('power_supply', f'{joypad}/power_supply/sony_controller_battery_ff:ff:ff:ff:ff:ff',
+             {'type': 'Battery',
+              'scope': 'Device',
+              'present': '1',
+              'status': 'Charging',
+              'capacity': '20'},
+             {}),
+        ])
+
+        devs = self.wait_for_devices(1)
+        joypadbat0_up = devs[0]
+
+        props = self.get_dbus_dev_properties(joypadbat0_up)
+        self.assertEqual(props['Model'], 'Sony Interactive Entertainment Wireless Controller')
+        self.assertEqual(props['Serial'], 'ff:ff:ff:ff:ff:ff')
+        self.assertEqual(props['PowerSupply'], False)
+        self.assertEqual(props['Type'], UP_DEVICE_KIND_GAMING_INPUT)
+        self.assertEqual(self.get_dbus_property('OnBattery'), False)
+        self.assertEqual(self.get_dbus_display_property('WarningLevel'), UP_DEVICE_LEVEL_NONE)
 
 if __name__ == '__main__':
     try:
@@ -25,6 +25,7 @@ import time
 import threading
 import select
 import errno
+import collections
 
 class OutputChecker(object):
 
@@ -33,7 +34,7 @@ class OutputChecker(object):
         self._pipe_fd_r, self._pipe_fd_w = os.pipe()
         self._partial_buf = b''
         self._lines_sem = threading.Semaphore()
-        self._lines = []
+        self._lines = collections.deque()
         self._reader_io = io.StringIO()
 
         # Just to be sure, shouldn't be a problem even if we didn't set it
@@ -56,7 +57,7 @@ class OutputChecker(object):
                 # FD is forcefully closed.
                 p.poll(0.1)
 
-                r = os.read(self._pipe_fd_r, 1024)
+                r = os.read(self._pipe_fd_r, 65536)
                 if not r:
                     os.close(self._pipe_fd_r)
                     self._pipe_fd_r = -1
@@ -82,58 +83,53 @@ class OutputChecker(object):
 
             os.write(self._output.fileno(), r)
 
-    def check_line_re(self, needle_re, timeout=0, failmsg=None):
+    def _check_line(self, match, needle, timeout, failmsg):
         deadline = time.time() + timeout
-
-        if isinstance(needle_re, str):
-            needle_re = needle_re.encode('ascii')
-
-        r = re.compile(needle_re)
         ret = []
 
         while True:
             try:
-                l = self._lines.pop(0)
+                l = self._lines.popleft()
             except IndexError:
                 # EOF, throw error
                 if self._pipe_fd_r == -1:
                     if failmsg:
-                        raise AssertionError("No further messages: " % failmsg) from None
+                        raise AssertionError("No further messages: %s" % failmsg) from None
                     else:
-                        raise AssertionError('No client waiting for needle %s' % (str(needle_re))) from None
+                        raise AssertionError('No client waiting for needle %s' % (str(needle))) from None
 
                 # Check if should wake up
                 if not self._lines_sem.acquire(timeout = deadline - time.time()):
                     if failmsg:
                         raise AssertionError(failmsg) from None
                     else:
-                        raise AssertionError('Timed out waiting for needle %s (timeout: %0.2f)' % (str(needle_re), timeout)) from None
+                        raise AssertionError('Timed out waiting for needle %s (timeout: %0.2f)' % (str(needle), timeout)) from None
                 continue
 
             ret.append(l)
-            if r.search(l):
+            if match(l):
                 return ret
 
+    def check_line_re(self, needle_re, timeout=0, failmsg=None):
+        if isinstance(needle_re, str):
+            needle_re = needle_re.encode('ascii')
+
+        return self._check_line(re.compile(needle_re).search, needle_re, timeout, failmsg)
+
     def check_line(self, needle, timeout=0, failmsg=None):
         if isinstance(needle, str):
             needle = needle.encode('ascii')
 
-        needle_re = re.escape(needle)
-
-        return self.check_line_re(needle_re, timeout=timeout, failmsg=failmsg)
+        # plain substring search is a lot cheaper than a regex
+        return self._check_line(lambda l: needle in l, needle, timeout, failmsg)
 
-    def check_no_line_re(self, needle_re, wait=0, failmsg=None):
+    def _check_no_line(self, match, needle, wait, failmsg):
         deadline = time.time() + wait
-
-        if isinstance(needle_re, str):
-            needle_re = needle_re.encode('ascii')
-
-        r = re.compile(needle_re)
         ret = []
 
         while True:
             try:
-                l = self._lines.pop(0)
+                l = self._lines.popleft()
             except IndexError:
                 # EOF, so everything good
                 if self._pipe_fd_r == -1:
@@ -146,26 +142,30 @@ class OutputChecker(object):
                 continue
 
             ret.append(l)
-            if r.search(l):
+            if match(l):
                 if failmsg:
                     raise AssertionError(failmsg)
                 else:
-                    raise AssertionError('Found needle %s but shouldn\'t have been there (timeout: %0.2f)' % (str(needle_re), wait))
+                    raise AssertionError('Found needle %s but shouldn\'t have been there (timeout: %0.2f)' % (str(needle), wait))
 
         return ret
 
+    def check_no_line_re(self, needle_re, wait=0, failmsg=None):
+        if isinstance(needle_re, str):
+            needle_re = needle_re.encode('ascii')
+
+        return self._check_no_line(re.compile(needle_re).search, needle_re, wait, failmsg)
+
     def check_no_line(self, needle, wait=0, failmsg=None):
         if isinstance(needle, str):
             needle = needle.encode('ascii')
 
-        needle_re = re.escape(needle)
-
-        return self.check_no_line_re(needle_re, wait=wait, failmsg=failmsg)
+        return self._check_no_line(lambda l: needle in l, needle, wait, failmsg)
 
     def clear(self):
         ret = self._lines
-        self._lines = []
-        return ret
+        self._lines = collections.deque()
+        return list(ret)
 
     def assert_closed(self, timeout=1):
         self._thread.join(timeout)